@@ -1,9 +1,15 @@
 import streamlit as st
 from supabase import create_client, Client
-import pandas as pd
-from datetime import datetime, date, timedelta
-import json
-import hashlib
+from supabase.lib.client_options import ClientOptions
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+import httpx
+import pyarrow as pa
+import pyarrow.compute as pc
+import orjson
+import textwrap
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
 
 # ------------------------
 # Page Config
@@ -17,9 +23,36 @@ st.sidebar.title("🔑 Supabase Connection")
 url = st.sidebar.text_input("Supabase URL", "https://your-project.supabase.co")
 key = st.sidebar.text_input("Supabase API Key (service_role for demo)", type="password")
 
+# Shared keep-alive pool so reruns and sessions reuse warm TLS connections
+HTTP_POOL_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=30)
+
+class OrjsonClient(httpx.Client):
+    """httpx client that encodes `json=` request bodies with orjson instead of the stdlib encoder"""
+    def build_request(self, method, url, *, json=None, content=None, headers=None, **kwargs):
+        if json is not None and content is None:
+            content = orjson.dumps(json)
+            headers = httpx.Headers(headers)
+            headers["Content-Type"] = "application/json"
+        return super().build_request(method, url, content=content, headers=headers, **kwargs)
+
 @st.cache_resource
 def init_client(url, key):
-    return create_client(url, key)
+    options = ClientOptions(postgrest_client_timeout=10)
+    client = create_client(url, key, options=options)
+    # supabase-py doesn't expose pool limits or the JSON encoder, so swap in a tuned PostgREST session
+    try:
+        session = client.postgrest.session
+        client.postgrest.session = OrjsonClient(
+            base_url=session.base_url,
+            headers=session.headers,
+            timeout=session.timeout,
+            limits=HTTP_POOL_LIMITS,
+            follow_redirects=True,
+        )
+        session.close()
+    except AttributeError:
+        pass
+    return client
 
 if url and key:
     supabase: Client = init_client(url, key)
@@ -34,7 +67,8 @@ else:
 
 # Individual table creation statements for better error handling
 TABLE_SCHEMAS = {
-    "extensions": """CREATE EXTENSION IF NOT EXISTS "uuid-ossp";""",
+    "extensions": """CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS btree_gin;""",
     
     "users": """
 CREATE TABLE IF NOT EXISTS users (
@@ -47,31 +81,70 @@ CREATE TABLE IF NOT EXISTS users (
 );""",
 
     "api_usage": """
+-- Range-partitioned by month so time-windowed analytics prune old partitions.
+-- Older deployments have a plain api_usage table: set it aside so the partitioned one can take its name
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('public.api_usage') AND relkind = 'r') THEN
+    ALTER TABLE public.api_usage RENAME TO api_usage_unpartitioned;
+  END IF;
+END $$;
 CREATE TABLE IF NOT EXISTS api_usage (
-    id BIGSERIAL PRIMARY KEY,
+    id BIGSERIAL,
     user_id BIGINT NOT NULL,
     query TEXT NOT NULL,
     query_type VARCHAR(50) DEFAULT 'property_search',
-    created_at TIMESTAMPTZ DEFAULT NOW(),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     metadata JSONB DEFAULT '{}',
     response_time_ms INTEGER,
     success BOOLEAN DEFAULT TRUE,
-    error_message TEXT
-);""",
+    error_message TEXT,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+CREATE TABLE IF NOT EXISTS api_usage_default PARTITION OF api_usage DEFAULT;
+-- Copy the old rows over (they land in api_usage_default until their month's partition exists)
+DO $$
+BEGIN
+  IF to_regclass('public.api_usage_unpartitioned') IS NOT NULL THEN
+    INSERT INTO api_usage (id, user_id, query, query_type, created_at, metadata, response_time_ms, success, error_message)
+    SELECT id, user_id, query, query_type, COALESCE(created_at, NOW()), metadata, response_time_ms, success, error_message
+    FROM api_usage_unpartitioned;
+    PERFORM setval(pg_get_serial_sequence('api_usage', 'id'), COALESCE((SELECT max(id) FROM api_usage), 0) + 1, false);
+    DROP TABLE api_usage_unpartitioned;
+  END IF;
+END $$;""",
 
     "properties": """
 CREATE TABLE IF NOT EXISTS properties (
     id BIGSERIAL PRIMARY KEY,
     user_id BIGINT NOT NULL,
-    property_hash VARCHAR(32) UNIQUE,
+    property_hash UUID GENERATED ALWAYS AS (md5(data::text)::uuid) STORED,  -- 16-byte key, not 32-char text
     data JSONB NOT NULL,
     search_params JSONB DEFAULT '{}',
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW(),
     is_favorite BOOLEAN DEFAULT FALSE,
     notes TEXT,
-    tags TEXT[] DEFAULT ARRAY[]::TEXT[]
-);""",
+    tags TEXT[] DEFAULT ARRAY[]::TEXT[],
+    -- Dedupe per owner: two users saving the same listing keep separate rows
+    CONSTRAINT properties_user_property_hash_key UNIQUE (user_id, property_hash)
+);
+-- Older deployments have a client-written VARCHAR(32) property_hash, or a table-wide UNIQUE on it;
+-- move to the generated column keyed per user so ON CONFLICT (user_id, property_hash) matches.
+-- Fails (and rolls back) if one user has rows with identical data.
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM information_schema.columns
+             WHERE table_schema = 'public' AND table_name = 'properties'
+               AND column_name = 'property_hash' AND is_generated = 'NEVER') THEN
+    ALTER TABLE properties DROP COLUMN property_hash;
+    ALTER TABLE properties ADD COLUMN property_hash UUID GENERATED ALWAYS AS (md5(data::text)::uuid) STORED;
+  END IF;
+  ALTER TABLE properties DROP CONSTRAINT IF EXISTS properties_property_hash_key;
+  IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'properties_user_property_hash_key') THEN
+    ALTER TABLE properties ADD CONSTRAINT properties_user_property_hash_key UNIQUE (user_id, property_hash);
+  END IF;
+END $$;""",
 
     "user_sessions": """
 CREATE TABLE IF NOT EXISTS user_sessions (
@@ -106,12 +179,20 @@ CREATE TABLE IF NOT EXISTS property_comparisons (
     id BIGSERIAL PRIMARY KEY,
     user_id BIGINT NOT NULL,
     comparison_name VARCHAR(255),
-    property_ids BIGINT[] NOT NULL,
     comparison_data JSONB,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );""",
 
+    "property_comparison_items": """
+-- One row per compared property so comparisons join to properties through plain indexes
+CREATE TABLE IF NOT EXISTS property_comparison_items (
+    comparison_id BIGINT NOT NULL REFERENCES property_comparisons(id) ON DELETE CASCADE,
+    property_id BIGINT NOT NULL REFERENCES properties(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (comparison_id, property_id)
+);""",
+
     "user_preferences": """
 CREATE TABLE IF NOT EXISTS user_preferences (
     id BIGSERIAL PRIMARY KEY,
@@ -124,19 +205,28 @@ CREATE TABLE IF NOT EXISTS user_preferences (
 );""",
 
     "portfolio_analytics": """
-CREATE TABLE IF NOT EXISTS portfolio_analytics (
-    id BIGSERIAL PRIMARY KEY,
-    user_id BIGINT NOT NULL,
-    calculation_date DATE DEFAULT CURRENT_DATE,
-    total_properties INTEGER DEFAULT 0,
-    total_value DECIMAL(15,2) DEFAULT 0,
-    total_monthly_rent DECIMAL(10,2) DEFAULT 0,
-    average_cap_rate DECIMAL(5,2) DEFAULT 0,
-    total_cash_flow DECIMAL(10,2) DEFAULT 0,
-    metrics JSONB DEFAULT '{}',
-    created_at TIMESTAMPTZ DEFAULT NOW(),
-    UNIQUE(user_id, calculation_date)
-);""",
+-- Aggregated straight from properties; refreshed by refresh_portfolio_analytics() instead of an upsert job.
+-- Older deployments have a plain, upsert-maintained portfolio_analytics table holding only derived
+-- aggregates; drop it so the view can take its name (IF NOT EXISTS would otherwise skip the view).
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('public.portfolio_analytics') AND relkind = 'r') THEN
+    DROP TABLE public.portfolio_analytics;
+  END IF;
+END $$;
+CREATE MATERIALIZED VIEW IF NOT EXISTS portfolio_analytics AS
+SELECT
+    user_id,
+    CURRENT_DATE AS calculation_date,
+    count(*)::INTEGER AS total_properties,
+    COALESCE(sum((data->>'price')::NUMERIC), 0)::DECIMAL(15,2) AS total_value,
+    COALESCE(sum((data->>'monthly_rent')::NUMERIC), 0)::DECIMAL(10,2) AS total_monthly_rent,
+    COALESCE(avg((data->>'cap_rate')::NUMERIC), 0)::DECIMAL(5,2) AS average_cap_rate,
+    COALESCE(sum((data->>'cash_flow')::NUMERIC), 0)::DECIMAL(10,2) AS total_cash_flow,
+    jsonb_build_object('favorites', count(*) FILTER (WHERE is_favorite)) AS metrics,
+    NOW() AS created_at
+FROM properties
+GROUP BY user_id;""",
 
     "saved_searches": """
 CREATE TABLE IF NOT EXISTS saved_searches (
@@ -149,7 +239,21 @@ CREATE TABLE IF NOT EXISTS saved_searches (
     results_count INTEGER DEFAULT 0,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
-);"""
+);""",
+
+    "portal_analytics_mv": """
+-- Pre-aggregated property analytics so the Analytics tab reads a handful of rows, not the table
+CREATE MATERIALIZED VIEW IF NOT EXISTS portal_analytics_mv AS
+SELECT
+    COALESCE(data->>'property_type', 'unknown') AS property_type,
+    count(*) AS properties,
+    round(avg((data->>'price')::NUMERIC), 2) AS avg_price,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY (data->>'price')::NUMERIC) AS median_price,
+    round(avg((data->>'sqft')::NUMERIC)) AS avg_sqft,
+    count(*) FILTER (WHERE is_favorite) AS favorites
+FROM properties
+WHERE data ? 'price'
+GROUP BY 1;"""
 }
 
 # FINAL FIXED Index creation statements - Using proper JSONB operator classes
@@ -158,13 +262,15 @@ INDEX_SCHEMAS = {
     "idx_properties_user_id": "CREATE INDEX IF NOT EXISTS idx_properties_user_id ON properties(user_id);",
     "idx_properties_created_at": "CREATE INDEX IF NOT EXISTS idx_properties_created_at ON properties(created_at);",
     "idx_api_usage_user_id": "CREATE INDEX IF NOT EXISTS idx_api_usage_user_id ON api_usage(user_id);",
-    "idx_api_usage_created_at": "CREATE INDEX IF NOT EXISTS idx_api_usage_created_at ON api_usage(created_at);",
+    "idx_api_usage_created_at": "CREATE INDEX IF NOT EXISTS idx_api_usage_created_at ON api_usage (created_at) INCLUDE (query_type, response_time_ms, success);",
     "idx_api_usage_query_type": "CREATE INDEX IF NOT EXISTS idx_api_usage_query_type ON api_usage(query_type);",
     "idx_market_alerts_user_id": "CREATE INDEX IF NOT EXISTS idx_market_alerts_user_id ON market_alerts(user_id);",
-    "idx_market_alerts_active": "CREATE INDEX IF NOT EXISTS idx_market_alerts_active ON market_alerts(is_active) WHERE is_active = true;",
     "idx_user_sessions_last_login": "CREATE INDEX IF NOT EXISTS idx_user_sessions_last_login ON user_sessions(last_login);",
+    "idx_portfolio_analytics_user_date": "CREATE UNIQUE INDEX IF NOT EXISTS idx_portfolio_analytics_user_date ON portfolio_analytics(user_id, calculation_date);",
+    "idx_portal_analytics_mv_type": "CREATE UNIQUE INDEX IF NOT EXISTS idx_portal_analytics_mv_type ON portal_analytics_mv(property_type);",
     "idx_portfolio_analytics_date": "CREATE INDEX IF NOT EXISTS idx_portfolio_analytics_date ON portfolio_analytics(calculation_date);",
     "idx_saved_searches_user_id": "CREATE INDEX IF NOT EXISTS idx_saved_searches_user_id ON saved_searches(user_id);",
+    "idx_property_comparison_items_property_id": "CREATE INDEX IF NOT EXISTS idx_property_comparison_items_property_id ON property_comparison_items(property_id);",
     
     # OPTIMAL GIN indexes for JSONB columns using jsonb_path_ops (RECOMMENDED)
     "idx_properties_data_gin": "CREATE INDEX IF NOT EXISTS idx_properties_data_gin ON properties USING GIN (data jsonb_path_ops);",
@@ -176,9 +282,13 @@ INDEX_SCHEMAS = {
     "idx_portfolio_analytics_metrics_gin": "CREATE INDEX IF NOT EXISTS idx_portfolio_analytics_metrics_gin ON portfolio_analytics USING GIN (metrics jsonb_path_ops);",
     "idx_property_comparisons_data_gin": "CREATE INDEX IF NOT EXISTS idx_property_comparisons_data_gin ON property_comparisons USING GIN (comparison_data jsonb_path_ops);",
     
+    # Composite GIN indexes (btree_gin) for per-user containment queries - one scan, no BitmapAnd
+    "idx_properties_user_data_gin": "CREATE INDEX IF NOT EXISTS idx_properties_user_data_gin ON properties USING GIN (user_id, data jsonb_path_ops);",
+    "idx_market_alerts_user_criteria_gin": "CREATE INDEX IF NOT EXISTS idx_market_alerts_user_criteria_gin ON market_alerts USING GIN (user_id, criteria jsonb_path_ops);",
+    "idx_saved_searches_user_criteria_gin": "CREATE INDEX IF NOT EXISTS idx_saved_searches_user_criteria_gin ON saved_searches USING GIN (user_id, search_criteria jsonb_path_ops);",
+    
     # GIN indexes for TEXT[] arrays (these work perfectly)
     "idx_properties_tags_gin": "CREATE INDEX IF NOT EXISTS idx_properties_tags_gin ON properties USING GIN (tags);",
-    "idx_property_comparisons_ids_gin": "CREATE INDEX IF NOT EXISTS idx_property_comparisons_ids_gin ON property_comparisons USING GIN (property_ids);",
     
     # B-tree expression indexes for commonly queried JSONB fields  
     "idx_properties_price": "CREATE INDEX IF NOT EXISTS idx_properties_price ON properties USING BTREE (((data->>'price')::NUMERIC)) WHERE data ? 'price';",
@@ -186,6 +296,7 @@ INDEX_SCHEMAS = {
     "idx_properties_bathrooms": "CREATE INDEX IF NOT EXISTS idx_properties_bathrooms ON properties USING BTREE (((data->>'bathrooms')::NUMERIC)) WHERE data ? 'bathrooms';",
     "idx_properties_property_type": "CREATE INDEX IF NOT EXISTS idx_properties_property_type ON properties USING BTREE ((data->>'property_type')) WHERE data ? 'property_type';",
     "idx_properties_sqft": "CREATE INDEX IF NOT EXISTS idx_properties_sqft ON properties USING BTREE (((data->>'sqft')::INTEGER)) WHERE data ? 'sqft';",
+    "idx_properties_address": "CREATE INDEX IF NOT EXISTS idx_properties_address ON properties USING BTREE ((data->>'address') text_pattern_ops) WHERE data ? 'address';",
     
     # Full-text search indexes using GIN with proper operator classes
     "idx_api_usage_query_fulltext": "CREATE INDEX IF NOT EXISTS idx_api_usage_query_fulltext ON api_usage USING GIN (to_tsvector('english', query));",
@@ -194,21 +305,41 @@ INDEX_SCHEMAS = {
     # Additional useful indexes for real estate queries
     "idx_properties_favorite": "CREATE INDEX IF NOT EXISTS idx_properties_favorite ON properties (is_favorite) WHERE is_favorite = true;",
     "idx_properties_with_notes": "CREATE INDEX IF NOT EXISTS idx_properties_with_notes ON properties (user_id) WHERE notes IS NOT NULL;",
+    
+    # Partial indexes matching hot query shapes (favorites/notes, active alerts per user)
+    "idx_properties_user_favorites": "CREATE INDEX IF NOT EXISTS idx_properties_user_favorites ON properties (user_id, created_at DESC) WHERE is_favorite = TRUE OR notes IS NOT NULL;",
+    "idx_market_alerts_user_active": "CREATE INDEX IF NOT EXISTS idx_market_alerts_user_active ON market_alerts (user_id) WHERE is_active = TRUE;",
+}
+
+# CONCURRENTLY variants for adding indexes to a live, populated database without blocking writes.
+# Each must run as its own statement, outside a transaction block, so they are kept out of the
+# bootstrap script. api_usage is partitioned, which CONCURRENTLY doesn't support.
+ONLINE_INDEX_SCHEMAS = {
+    name: sql.replace(" INDEX IF NOT EXISTS", " INDEX CONCURRENTLY IF NOT EXISTS", 1)
+    for name, sql in INDEX_SCHEMAS.items() if not name.startswith("idx_api_usage")
 }
 
+# Static index groupings for the generated SQL script
+_GIN_KEYS = tuple(k for k in INDEX_SCHEMAS if 'gin' in k)
+_EXPR_KEYS = tuple(k for k in INDEX_SCHEMAS if k not in _GIN_KEYS and any(x in k for x in ('price', 'bedrooms', 'bathrooms', 'sqft', 'property_type', 'address')))
+_BASIC_KEYS = tuple(k for k in INDEX_SCHEMAS if k not in _GIN_KEYS and k not in _EXPR_KEYS)
+
 # RLS (Row Level Security) policies
+# auth.uid() is wrapped in a scalar subquery so Postgres evaluates it once per query (InitPlan), not per row
 RLS_POLICIES = {
     "users": """
 -- Enable RLS on users table
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 
 -- Policy: Users can only see their own data
-CREATE POLICY IF NOT EXISTS "Users can view own profile" ON users
-    FOR SELECT USING (auth.uid()::text = id::text);
+DROP POLICY IF EXISTS "Users can view own profile" ON users;
+CREATE POLICY "Users can view own profile" ON users
+    FOR SELECT USING ((SELECT auth.uid())::text = id::text);
 
 -- Policy: Users can update their own data  
-CREATE POLICY IF NOT EXISTS "Users can update own profile" ON users
-    FOR UPDATE USING (auth.uid()::text = id::text);
+DROP POLICY IF EXISTS "Users can update own profile" ON users;
+CREATE POLICY "Users can update own profile" ON users
+    FOR UPDATE USING ((SELECT auth.uid())::text = id::text);
 """,
     
     "properties": """
@@ -216,20 +347,24 @@ CREATE POLICY IF NOT EXISTS "Users can update own profile" ON users
 ALTER TABLE properties ENABLE ROW LEVEL SECURITY;
 
 -- Policy: Users can only see their own properties
-CREATE POLICY IF NOT EXISTS "Users can view own properties" ON properties
-    FOR SELECT USING (auth.uid()::text = user_id::text);
+DROP POLICY IF EXISTS "Users can view own properties" ON properties;
+CREATE POLICY "Users can view own properties" ON properties
+    FOR SELECT USING ((SELECT auth.uid())::text = user_id::text);
 
 -- Policy: Users can insert their own properties
-CREATE POLICY IF NOT EXISTS "Users can insert own properties" ON properties
-    FOR INSERT WITH CHECK (auth.uid()::text = user_id::text);
+DROP POLICY IF EXISTS "Users can insert own properties" ON properties;
+CREATE POLICY "Users can insert own properties" ON properties
+    FOR INSERT WITH CHECK ((SELECT auth.uid())::text = user_id::text);
 
 -- Policy: Users can update their own properties
-CREATE POLICY IF NOT EXISTS "Users can update own properties" ON properties
-    FOR UPDATE USING (auth.uid()::text = user_id::text);
+DROP POLICY IF EXISTS "Users can update own properties" ON properties;
+CREATE POLICY "Users can update own properties" ON properties
+    FOR UPDATE USING ((SELECT auth.uid())::text = user_id::text);
 
 -- Policy: Users can delete their own properties
-CREATE POLICY IF NOT EXISTS "Users can delete own properties" ON properties
-    FOR DELETE USING (auth.uid()::text = user_id::text);
+DROP POLICY IF EXISTS "Users can delete own properties" ON properties;
+CREATE POLICY "Users can delete own properties" ON properties
+    FOR DELETE USING ((SELECT auth.uid())::text = user_id::text);
 """,
 
     "api_usage": """
@@ -237,25 +372,643 @@ CREATE POLICY IF NOT EXISTS "Users can delete own properties" ON properties
 ALTER TABLE api_usage ENABLE ROW LEVEL SECURITY;
 
 -- Policy: Users can only see their own API usage
-CREATE POLICY IF NOT EXISTS "Users can view own api usage" ON api_usage
-    FOR SELECT USING (auth.uid()::text = user_id::text);
+DROP POLICY IF EXISTS "Users can view own api usage" ON api_usage;
+CREATE POLICY "Users can view own api usage" ON api_usage
+    FOR SELECT USING ((SELECT auth.uid())::text = user_id::text);
 """
 }
 
-# Function to check table existence
-def check_table_exists(table_name):
-    """Check if a table exists in the database"""
-    try:
-        result = supabase.table(table_name).select("*").limit(1).execute()
-        return True
-    except Exception:
-        return False
+# RPC functions called by the app (one round-trip instead of several REST calls)
+FUNCTION_SCHEMAS = {
+    "apply_schema": """
+-- Runs a list of DDL statements in one transaction (all or nothing); service_role only
+CREATE OR REPLACE FUNCTION apply_schema(sqls TEXT[]) RETURNS VOID
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+  stmt TEXT;
+BEGIN
+  FOREACH stmt IN ARRAY sqls LOOP
+    EXECUTE stmt;
+  END LOOP;
+END;
+$$;
+REVOKE EXECUTE ON FUNCTION apply_schema(TEXT[]) FROM PUBLIC, anon, authenticated;""",
+
+    "estimated_row_count": """
+-- Planner estimate (pg_class.reltuples, summed over partitions for partitioned tables). Tables never
+-- analyzed report -1 and autovacuum skips tiny ones, so small or unanalyzed tables get an exact
+-- count(*) instead - the same trade-off PostgREST's count=estimated makes below db-max-rows
+CREATE OR REPLACE FUNCTION estimated_row_count(rel REGCLASS, exact_below BIGINT DEFAULT 1000) RETURNS BIGINT
+LANGUAGE plpgsql STABLE AS $$
+DECLARE
+  estimate DOUBLE PRECISION;
+  result BIGINT;
+BEGIN
+  SELECT CASE WHEN bool_or(reltuples < 0) THEN -1 ELSE sum(reltuples) END INTO estimate
+  FROM pg_class
+  WHERE (oid = rel AND relkind <> 'p')
+     OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = rel);
+  IF estimate IS NULL OR estimate < exact_below THEN
+    EXECUTE format('SELECT count(*) FROM %s', rel) INTO result;
+    RETURN result;
+  END IF;
+  RETURN estimate::BIGINT;
+END;
+$$;""",
+
+    "get_portal_counts": """
+DROP FUNCTION IF EXISTS get_portal_counts();
+-- Planner estimates by default: O(1) on large tables, exact on small or unanalyzed ones
+CREATE OR REPLACE FUNCTION get_portal_counts(exact BOOLEAN DEFAULT FALSE) RETURNS JSONB LANGUAGE sql STABLE AS $$
+  SELECT CASE WHEN exact THEN jsonb_build_object(
+    'users', (SELECT count(*) FROM users),
+    'properties', (SELECT count(*) FROM properties),
+    'api_usage', (SELECT count(*) FROM api_usage),
+    'market_alerts', (SELECT count(*) FROM market_alerts))
+  ELSE jsonb_build_object(
+    'users', estimated_row_count('users'),
+    'properties', estimated_row_count('properties'),
+    'api_usage', estimated_row_count('api_usage'),
+    'market_alerts', estimated_row_count('market_alerts'))
+  END;
+$$;""",
+
+    "create_api_usage_partition": """
+-- Monthly api_usage partitions; the current and next two months are created up front, then
+-- pg_cron (when enabled) adds month N+2 on the 1st so rows rarely fall into api_usage_default.
+-- Without pg_cron a month can fill the default partition first, which would block its partition:
+-- those rows are parked, the partition is attached, then they are routed back through the parent.
+CREATE OR REPLACE FUNCTION create_api_usage_partition(year INT, month INT) RETURNS VOID
+LANGUAGE plpgsql SET search_path = public AS $$
+DECLARE
+  start_date DATE := make_date(year, month, 1);
+  end_date DATE := (make_date(year, month, 1) + INTERVAL '1 month')::DATE;
+  partition_name TEXT := 'api_usage_' || to_char(make_date(year, month, 1), 'YYYY_MM');
+BEGIN
+  IF to_regclass(partition_name) IS NOT NULL THEN
+    RETURN;
+  END IF;
+  CREATE TEMP TABLE api_usage_parked (LIKE api_usage_default);
+  WITH moved AS (
+    DELETE FROM api_usage_default WHERE created_at >= start_date AND created_at < end_date RETURNING *
+  )
+  INSERT INTO api_usage_parked SELECT * FROM moved;
+  EXECUTE format('CREATE TABLE %I PARTITION OF api_usage FOR VALUES FROM (%L) TO (%L)',
+                 partition_name, start_date, end_date);
+  INSERT INTO api_usage SELECT * FROM api_usage_parked;
+  DROP TABLE api_usage_parked;
+END;
+$$;
+SELECT create_api_usage_partition(EXTRACT(YEAR FROM m)::INT, EXTRACT(MONTH FROM m)::INT)
+FROM generate_series(date_trunc('month', NOW()), date_trunc('month', NOW()) + INTERVAL '2 months', INTERVAL '1 month') AS m;
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('create-api-usage-partition', '0 0 1 * *', $job$
+      SELECT create_api_usage_partition(EXTRACT(YEAR FROM m)::INT, EXTRACT(MONTH FROM m)::INT)
+      FROM (SELECT date_trunc('month', NOW()) + INTERVAL '2 months' AS m) AS next_month
+    $job$);
+  END IF;
+END $$;""",
+
+    "truncate_api_usage": """
+-- TRUNCATE skips per-row MVCC work, so clearing the log is constant-time
+CREATE OR REPLACE FUNCTION truncate_api_usage() RETURNS VOID
+LANGUAGE sql SECURITY DEFINER SET search_path = public AS $$
+  TRUNCATE api_usage RESTART IDENTITY;
+$$;
+REVOKE EXECUTE ON FUNCTION truncate_api_usage() FROM PUBLIC, anon, authenticated;""",
+
+    "delete_sample_properties": """
+-- Uses idx_properties_user_id and returns the deleted count in the same round-trip
+CREATE OR REPLACE FUNCTION delete_sample_properties(sample_user_id BIGINT DEFAULT 1) RETURNS BIGINT
+LANGUAGE sql SECURITY DEFINER SET search_path = public AS $$
+  WITH deleted AS (DELETE FROM properties WHERE user_id = sample_user_id RETURNING 1)
+  SELECT count(*) FROM deleted;
+$$;
+REVOKE EXECUTE ON FUNCTION delete_sample_properties(BIGINT) FROM PUBLIC, anon, authenticated;""",
+
+    "count_distinct_user_ids": """
+-- COUNT(DISTINCT user_id) over the whole table, served by the idx_*_user_id indexes
+CREATE OR REPLACE FUNCTION count_distinct_user_ids(table_name TEXT) RETURNS BIGINT
+LANGUAGE plpgsql STABLE AS $$
+DECLARE
+  result BIGINT;
+BEGIN
+  EXECUTE format('SELECT count(DISTINCT user_id) FROM %I', table_name) INTO result;
+  RETURN result;
+END;
+$$;""",
+
+    "refresh_portfolio_analytics": """
+-- CONCURRENTLY keeps the view readable during refresh (needs idx_portfolio_analytics_user_date);
+-- scheduled every 15 minutes when pg_cron is enabled
+CREATE OR REPLACE FUNCTION refresh_portfolio_analytics() RETURNS VOID
+LANGUAGE sql SECURITY DEFINER SET search_path = public AS $$
+  REFRESH MATERIALIZED VIEW CONCURRENTLY portfolio_analytics;
+$$;
+REVOKE EXECUTE ON FUNCTION refresh_portfolio_analytics() FROM PUBLIC, anon, authenticated;
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('refresh-portfolio-analytics', '*/15 * * * *', 'SELECT refresh_portfolio_analytics()');
+  END IF;
+END $$;""",
+
+    "refresh_portal_analytics": """
+-- Hourly refresh of the Analytics tab aggregates (needs idx_portal_analytics_mv_type)
+CREATE OR REPLACE FUNCTION refresh_portal_analytics() RETURNS VOID
+LANGUAGE sql SECURITY DEFINER SET search_path = public AS $$
+  REFRESH MATERIALIZED VIEW CONCURRENTLY portal_analytics_mv;
+$$;
+REVOKE EXECUTE ON FUNCTION refresh_portal_analytics() FROM PUBLIC, anon, authenticated;
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('refresh-portal-analytics', '0 * * * *', 'SELECT refresh_portal_analytics()');
+  END IF;
+END $$;""",
+
+    "reset_all_data": """
+-- Empties every portal table in one transaction; TRUNCATE avoids per-row DELETE work
+CREATE OR REPLACE FUNCTION reset_all_data() RETURNS VOID
+LANGUAGE sql SECURITY DEFINER SET search_path = public AS $$
+  TRUNCATE api_usage, market_alerts, saved_searches, property_comparison_items, property_comparisons,
+           properties, user_preferences, user_sessions, users RESTART IDENTITY CASCADE;
+  REFRESH MATERIALIZED VIEW portfolio_analytics;
+  REFRESH MATERIALIZED VIEW portal_analytics_mv;
+$$;
+REVOKE EXECUTE ON FUNCTION reset_all_data() FROM PUBLIC, anon, authenticated;""",
+
+    "bulk_insert_properties": """
+-- Set-based seeding: one INSERT ... SELECT over the JSON array instead of PostgREST's per-row path
+CREATE OR REPLACE FUNCTION bulk_insert_properties(items JSONB) RETURNS BIGINT
+LANGUAGE sql SET search_path = public AS $$
+  WITH inserted AS (
+    INSERT INTO properties (user_id, data, search_params, tags)
+    SELECT (e->>'user_id')::BIGINT, e->'data', e->'search_params',
+           ARRAY(SELECT jsonb_array_elements_text(COALESCE(e->'tags', '[]'::jsonb)))
+    FROM jsonb_array_elements(items) AS e
+    ON CONFLICT (user_id, property_hash) DO NOTHING
+    RETURNING 1
+  )
+  SELECT count(*) FROM inserted;
+$$;""",
+
+    "get_table_stats": """
+-- Existence + row estimates for many tables in one round-trip (exact for small or unanalyzed tables)
+CREATE OR REPLACE FUNCTION get_table_stats(names TEXT[]) RETURNS TABLE(name TEXT, est_rows BIGINT)
+LANGUAGE sql STABLE AS $$
+  SELECT c.relname::TEXT, estimated_row_count(c.oid)
+  FROM pg_class c
+  JOIN pg_namespace n ON n.oid = c.relnamespace
+  WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'm') AND c.relname = ANY(names);
+$$;""",
+}
+
+# Data Viewer projections - JSONB payloads are left out and fetched per row on demand
+TABLE_COLUMNS = {
+    "users": "id,email,full_name,role,created_at,updated_at",
+    "api_usage": "id,user_id,query,query_type,response_time_ms,success,error_message,created_at",
+    "properties": "id,user_id,property_hash,is_favorite,notes,tags,created_at",
+    "user_sessions": "id,user_id,last_login,session_count,created_at,updated_at",
+    "market_alerts": "id,user_id,alert_name,alert_type,location,threshold,notification_method,is_active,last_triggered,created_at",
+    "property_comparisons": "id,user_id,comparison_name,created_at,updated_at",
+    "user_preferences": "id,user_id,created_at,updated_at",
+    "portfolio_analytics": "user_id,calculation_date,total_properties,total_value,total_monthly_rent,average_cap_rate,total_cash_flow,created_at",
+    "saved_searches": "id,user_id,search_name,auto_notify,last_run,results_count,created_at,updated_at",
+}
+
+# Row key for tables without an `id` column (the analytics view has one row per user)
+ROW_KEYS = {
+    "portfolio_analytics": "user_id",
+}
+
+# JSONB columns per table, loaded lazily by the "View JSON" panel
+TABLE_JSON_COLUMNS = {
+    "api_usage": "metadata",
+    "properties": "data,search_params",
+    "user_sessions": "user_data,preferences",
+    "market_alerts": "criteria",
+    "property_comparisons": "comparison_data",
+    "user_preferences": "notifications,display_settings,api_settings",
+    "portfolio_analytics": "metrics",
+    "saved_searches": "search_criteria",
+}
+
+# ------------------------
+# Static UI Content
+# ------------------------
+# Built once at import rather than on every rerun inside the tab blocks
+
+TABLES = (
+    "users", "api_usage", "properties", "user_sessions",
+    "market_alerts", "property_comparisons", "user_preferences",
+    "portfolio_analytics", "saved_searches"
+)
+
+ENTRY_TABLES = ("users", "properties", "api_usage", "market_alerts", "saved_searches")
+
+_RAW_QUERIES = {
+    "User Activity Summary": """
+SELECT 
+    u.email,
+    u.full_name,
+    u.role,
+    COUNT(p.id) as total_properties,
+    COUNT(au.id) as api_calls,
+    MAX(au.created_at) as last_activity
+FROM users u
+LEFT JOIN properties p ON u.id = p.user_id
+LEFT JOIN api_usage au ON u.id = au.user_id
+GROUP BY u.id, u.email, u.full_name, u.role
+ORDER BY total_properties DESC;
+    """,
+    
+    "Properties by Price Range (Uses Expression Index)": """
+SELECT 
+    CASE 
+        WHEN (data->>'price')::NUMERIC < 200000 THEN 'Under $200k'
+        WHEN (data->>'price')::NUMERIC < 500000 THEN '$200k - $500k'
+        WHEN (data->>'price')::NUMERIC < 1000000 THEN '$500k - $1M'
+        ELSE 'Over $1M'
+    END as price_range,
+    COUNT(*) as property_count,
+    AVG((data->>'price')::NUMERIC) as avg_price
+FROM properties 
+WHERE data ? 'price'  -- Matches the partial idx_properties_price predicate
+GROUP BY price_range
+ORDER BY AVG((data->>'price')::NUMERIC);
+    """,
+    
+    "JSONB Search Examples (Uses GIN Index)": """
+-- Find houses with pools (uses GIN index on data)
+SELECT data->>'address', data->>'price', data->>'property_type'
+FROM properties 
+WHERE data @> '{"property_type": "house"}' 
+  AND tags @> ARRAY['pool'];
+    """,
+    
+    "Filtered Price Search (GIN + Expression Index)": """
+-- Scalar equality goes through @> so the jsonb_path_ops GIN index applies;
+-- ->> extraction cannot use it. The price range stays on idx_properties_price.
+SELECT id, data->>'address' AS address, (data->>'price')::NUMERIC AS price
+FROM properties
+WHERE data @> '{"property_type": "house", "bedrooms": 3}'::jsonb
+  AND data ? 'price'
+  AND (data->>'price')::NUMERIC BETWEEN 300000 AND 600000;
+    """,
+    
+    "API Usage Analytics": """
+SELECT 
+    DATE(created_at) as date,
+    query_type,
+    COUNT(*) as query_count,
+    AVG(response_time_ms) as avg_response_time,
+    COUNT(*) FILTER (WHERE success = false) as failed_queries
+FROM api_usage 
+WHERE created_at >= NOW() - INTERVAL '30 days'
+GROUP BY DATE(created_at), query_type
+ORDER BY date DESC, query_count DESC;
+    """,
+    
+    "User Favorites & Notes": """
+SELECT 
+    u.email,
+    p.data->>'address' as property_address,
+    p.data->>'price' as price,
+    p.notes,
+    p.tags,
+    p.created_at as saved_date
+FROM properties p
+JOIN users u ON p.user_id = u.id
+WHERE p.is_favorite = true OR p.notes IS NOT NULL  -- Matches the partial idx_properties_user_favorites
+-- Narrow by listing attributes with containment (GIN) rather than ->> comparisons:
+--   AND p.data @> '{"property_type": "house"}'::jsonb
+ORDER BY p.created_at DESC;
+    """,
+    
+    "Market Alert Summary": """
+SELECT 
+    ma.alert_name,
+    ma.alert_type,
+    ma.location,
+    ma.criteria,
+    ma.threshold,
+    ma.is_active,
+    u.email as user_email,
+    ma.last_triggered
+FROM market_alerts ma
+JOIN users u ON ma.user_id = u.id
+ORDER BY ma.created_at DESC;
+    """,
+    
+    "Property Search Patterns": """
+SELECT 
+    p.search_params->>'location' as search_location,
+    p.search_params->>'property_type' as property_type,
+    COUNT(*) as search_count,
+    AVG((p.data->>'price')::NUMERIC) as avg_price_found
+FROM properties p
+WHERE p.search_params IS NOT NULL
+-- To scope to one location, prefilter with containment (GIN) instead of ->>:
+--   AND p.search_params @> '{"location": "Seattle"}'::jsonb
+GROUP BY p.search_params->>'location', p.search_params->>'property_type'
+HAVING COUNT(*) > 1
+ORDER BY search_count DESC;
+    """
+}
+
+# Dedented and stripped once so st.code ships no padding to the browser
+QUERY_EXAMPLES = MappingProxyType({name: textwrap.dedent(sql).strip() for name, sql in _RAW_QUERIES.items()})
+
+SAMPLE_PROPERTIES = (
+    {"address": "123 Oak St, Seattle, WA", "price": 450000, "bedrooms": 3, "bathrooms": 2, "property_type": "house", "sqft": 1800},
+    {"address": "456 Pine Ave, Seattle, WA", "price": 325000, "bedrooms": 2, "bathrooms": 1, "property_type": "condo", "sqft": 1200},
+    {"address": "789 Elm Dr, Bellevue, WA", "price": 675000, "bedrooms": 4, "bathrooms": 3, "property_type": "house", "sqft": 2400},
+    {"address": "321 Maple Ln, Redmond, WA", "price": 275000, "bedrooms": 2, "bathrooms": 2, "property_type": "townhouse", "sqft": 1400},
+    {"address": "654 Cedar St, Kirkland, WA", "price": 825000, "bedrooms": 5, "bathrooms": 4, "property_type": "house", "sqft": 3200},
+    {"address": "987 Birch Rd, Bothell, WA", "price": 395000, "bedrooms": 3, "bathrooms": 2, "property_type": "condo", "sqft": 1600},
+    {"address": "147 Spruce Ave, Tacoma, WA", "price": 550000, "bedrooms": 3, "bathrooms": 3, "property_type": "house", "sqft": 2000},
+    {"address": "258 Willow Dr, Everett, WA", "price": 425000, "bedrooms": 3, "bathrooms": 2, "property_type": "townhouse", "sqft": 1700},
+    {"address": "369 Aspen St, Renton, WA", "price": 750000, "bedrooms": 4, "bathrooms": 3, "property_type": "house", "sqft": 2800},
+    {"address": "741 Cherry Ln, Kent, WA", "price": 300000, "bedrooms": 2, "bathrooms": 1, "property_type": "condo", "sqft": 1100}
+)
+
+SAMPLE_TAGS = (
+    ["garage", "fireplace"], ["pool", "deck"], ["updated kitchen"], 
+    ["hardwood floors", "garage"], ["mountain view", "fireplace", "deck"],
+    ["downtown", "balcony"], ["garage", "garden"], ["fireplace", "updated"],
+    ["view", "garage", "deck"], ["parking", "balcony"]
+)
+
+SAMPLE_USERS = (
+    {"email": "john.buyer@example.com", "full_name": "John Buyer", "role": "subscriber"},
+    {"email": "sarah.agent@realty.com", "full_name": "Sarah Agent", "role": "agent"},
+    {"email": "admin@portal.com", "full_name": "Admin User", "role": "admin"}
+)
+
+SAMPLE_ALERTS = (
+    {
+        "alert_name": "Seattle Price Drop Alert",
+        "alert_type": "price_drop",
+        "location": "Seattle, WA",
+        "criteria": {"property_type": "house", "max_price": 600000},
+        "threshold": 25000
+    },
+    {
+        "alert_name": "New Condo Listings",
+        "alert_type": "new_listing", 
+        "location": "Bellevue, WA",
+        "criteria": {"property_type": "condo", "min_bedrooms": 2},
+        "threshold": 0
+    }
+)
+
+PROPERTY_ANALYTICS = (
+    "Properties by price range distribution",
+    "Average property prices by type", 
+    "Properties by location (city/state)",
+    "Price trends over time",
+    "Most popular property features",
+    "Property size vs price correlation"
+)
+
+USER_ANALYTICS = (
+    "User activity over time",
+    "Most popular search locations", 
+    "API usage patterns by user role",
+    "User engagement metrics (favorites, notes)",
+    "Search to save conversion rates",
+    "Alert effectiveness tracking"
+)
+
+# One markdown list per column: a single element instead of one st.write per bullet
+PROPERTY_ANALYTICS_MD = "\n".join(f"- {query}" for query in PROPERTY_ANALYTICS)
+USER_ANALYTICS_MD = "\n".join(f"- {query}" for query in USER_ANALYTICS)
+
+# Long expander bodies, dedented once here instead of on every rerun
+SQL_TIPS_MD = textwrap.dedent("""
+        **🚀 OPTIMAL JSONB Query Patterns (Using jsonb_path_ops indexes):**
+        
+        **⭐ SUPER FAST - Uses jsonb_path_ops GIN index:**
+        
+        Only `@>`, `@?` and `@@` can use the GIN index on `data`. `->>` extraction never does -
+        filter through `@>` for equality and leave ranges to the B-tree expression indexes below.
+        ```sql
+        -- Property type filtering (lightning fast)
+        WHERE data @> '{"property_type": "house"}'
+        
+        -- Multi-criteria property search (optimized)
+        WHERE data @> '{"property_type": "house", "bedrooms": 3}'
+        WHERE data @> '{"bathrooms": 2, "property_type": "condo"}'
+        
+        -- Nested feature searches (excellent performance)
+        WHERE data @> '{"features": {"pool": true}}'
+        WHERE data @> '{"amenities": {"garage": true, "fireplace": true}}'
+        
+        -- Complex containment queries
+        WHERE search_params @> '{"location": "Seattle", "max_price": 500000}'
+        WHERE criteria @> '{"alert_type": "price_drop"}'
+        ```
+        
+        **⚡ FAST - Uses B-tree expression indexes:**
+        ```sql
+        -- Numeric range queries (partial expression indexes - keep the `data ? 'key'` predicate)
+        WHERE data ? 'price' AND (data->>'price')::NUMERIC BETWEEN 200000 AND 500000
+        WHERE data ? 'bedrooms' AND (data->>'bedrooms')::INTEGER >= 3
+        WHERE data ? 'bathrooms' AND (data->>'bathrooms')::NUMERIC >= 2.5
+        WHERE data ? 'sqft' AND (data->>'sqft')::INTEGER > 1500
+        
+        -- Text equality (uses expression indexes)
+        WHERE data ? 'property_type' AND data->>'property_type' = 'house'
+        
+        -- Point lookup / dedupe key (UNIQUE (user_id, property_hash) B-tree, hash from md5(data::text)::uuid)
+        WHERE user_id = 1 AND property_hash = md5('{"address": "123 Oak St, Seattle, WA", ...}'::jsonb::text)::uuid
+        ```
+        
+        **🔍 FAST - Uses array GIN indexes:**
+        ```sql
+        -- Tag/feature searches (array operations)
+        WHERE tags @> ARRAY['pool']                  -- has tag (not = ANY, which GIN can't use)
+        WHERE tags @> ARRAY['pool', 'garage']        -- contains all
+        WHERE tags && ARRAY['pool', 'spa', 'deck']   -- overlaps any
+        ```
+        
+        **📝 FAST - Uses full-text search GIN:**
+        ```sql
+        -- Text search in queries/descriptions
+        WHERE to_tsvector('english', query) @@ to_tsquery('seattle & house')
+        WHERE to_tsvector('english', location) @@ plainto_tsquery('downtown seattle')
+        ```
+        
+        **🏠 Real Estate Query Examples (OPTIMIZED):**
+        
+        **Find luxury houses with pools (project only the fields the UI shows):**
+        ```sql
+        SELECT id, data->>'address' AS address, (data->>'price')::NUMERIC AS price, tags FROM properties
+        WHERE data @> '{"property_type": "house"}'           -- jsonb_path_ops GIN
+          AND data ? 'price'                                 -- partial index predicate
+          AND (data->>'price')::NUMERIC > 750000             -- B-tree expression  
+          AND tags @> ARRAY['pool']                          -- Array GIN
+          AND user_id = 123;                                 -- B-tree
+        ```
+        
+        **Search condos in price range with parking:**
+        ```sql
+        SELECT id, jsonb_build_object('address', data->'address', 'price', data->'price') AS summary
+        FROM properties
+        WHERE data @> '{"property_type": "condo"}'           -- jsonb_path_ops GIN
+          AND data ? 'price'                                 -- partial index predicate
+          AND (data->>'price')::NUMERIC BETWEEN 300000 AND 600000  -- B-tree expression
+          AND tags @> ARRAY['parking'];                      -- Array GIN
+        ```
+        
+        **Market alert matching:**
+        ```sql
+        SELECT ma.*, p.data->>'address' as property_address
+        FROM market_alerts ma
+        JOIN properties p ON p.data @> ma.criteria           -- Both use jsonb_path_ops!
+        WHERE ma.is_active = true 
+          AND (p.data->>'price')::NUMERIC <= ma.threshold;
+        ```
+        
+        **Advanced aggregation with JSONB:**
+        ```sql
+        SELECT 
+          data->>'property_type' as type,
+          data->>'city' as city,
+          COUNT(*) as count,
+          AVG((data->>'price')::NUMERIC) as avg_price,
+          PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY (data->>'price')::NUMERIC) as median_price
+        FROM properties 
+        WHERE data @> '{"bedrooms": 3}'                      -- Fast with jsonb_path_ops
+        GROUP BY data->>'property_type', data->>'city'
+        HAVING COUNT(*) >= 5
+        ORDER BY avg_price DESC;
+        ```
+        
+        **❌ AVOID - Key-existence operators as the only filter:**
+        ```sql
+        -- jsonb_path_ops GIN can't serve ?, ?& or ?| on their own:
+        WHERE data ? 'price'                    -- Alone: no index narrows this
+        WHERE data ?& ARRAY['price', 'beds']    -- Multiple keys - no index
+        WHERE data ?| ARRAY['pool', 'spa']      -- Any key exists - restructure query
+        
+        -- Better: keep `data ? 'key'` as the partial-index predicate and pair it with the
+        -- matching expression condition, so the planner picks idx_properties_price etc.
+        WHERE data ? 'price' AND (data->>'price')::NUMERIC > 0
+        WHERE data ? 'price' AND data ? 'bedrooms'
+          AND (data->>'price')::NUMERIC < 500000 AND (data->>'bedrooms')::INTEGER >= 3
+        ```
+        
+        **🎯 Query Performance Tips:**
+        
+        1. **Lead with containment**: Put `@>` conditions first in WHERE clause
+        2. **Combine indexes**: PostgreSQL can use multiple indexes efficiently  
+        3. **Use EXPLAIN**: Always check query plans for index usage
+        4. **Avoid functions**: Don't wrap indexed columns in functions
+        5. **Order matters**: Most selective conditions first
+        
+        **📈 Example EXPLAIN output:**
+        ```sql
+        EXPLAIN (ANALYZE, BUFFERS) 
+        SELECT id, data->>'address' AS address FROM properties 
+        WHERE data @> '{"property_type": "house"}' 
+          AND data ? 'price'
+          AND (data->>'price')::NUMERIC < 500000;
+          
+        -- Expected: 
+        -- Bitmap Index Scan on idx_properties_data_gin
+        -- Bitmap Index Scan on idx_properties_price  
+        -- BitmapAnd of the above
+        ```
+        """)
+
+INDEX_PERFORMANCE_MD = textwrap.dedent("""
+        **Fixed Index Types and Their Performance Benefits:**
+        
+        **🚀 GIN Indexes (Fixed):**
+        - `idx_properties_data_gin`: JSONB containment search (`jsonb_path_ops`)
+        - `idx_properties_tags_gin`: Fast array operations
+        - Query types: `@>`, `@?`, `@@` on JSONB; `@>`, `&&` on arrays
+        
+        **⚡ Expression Indexes:**
+        - `idx_properties_price`: Fast numeric price queries
+        - `idx_properties_bedrooms`: Bedroom filtering
+        - `idx_properties_property_type`: Property type searches
+        
+        **📈 Expected Query Performance:**
+        ```sql
+        -- Fast with GIN index
+        SELECT * FROM properties WHERE data @> '{"property_type": "house"}';
+        
+        -- Fast with Expression index (partial: WHERE data ? 'price')
+        SELECT * FROM properties WHERE data ? 'price' AND (data->>'price')::NUMERIC > 500000;
+        
+        -- Fast with Array GIN index
+        SELECT * FROM properties WHERE tags @> ARRAY['pool'];
+        ```
+        """)
+
+QUERY_PERFORMANCE_TIPS_MD = textwrap.dedent("""
+        **Optimized Query Patterns:**
+        
+        **✅ DO - Use indexes effectively:**
+        ```sql
+        -- Uses GIN index
+        WHERE data @> '{"bedrooms": 3}'
+        
+        -- Uses expression index (partial: WHERE data ? 'price')
+        WHERE data ? 'price' AND (data->>'price')::NUMERIC BETWEEN 200000 AND 500000
+        
+        -- Uses array GIN index
+        WHERE tags && ARRAY['pool', 'garage']
+        ```
+        
+        **❌ AVOID - Patterns that can't use indexes:**
+        ```sql
+        -- Can't use index - function on left side, leading wildcard
+        WHERE LOWER(data->>'address') LIKE '%seattle%'
+        -- Instead: exact or prefix match hits idx_properties_address (text_pattern_ops)
+        WHERE data ? 'address' AND data->>'address' LIKE '123 Oak St%'
+        
+        -- Can't use GIN index - negation
+        WHERE NOT (data @> '{"type": "condo"}')
+        
+        -- Can't use expression index - text operations on numeric field
+        WHERE (data->>'price') LIKE '5%'
+        ```
+        
+        **🚀 Advanced Optimization:**
+        ```sql
+        -- Combine indexes for complex queries; name the columns instead of SELECT *
+        SELECT id, data->>'address' AS address, (data->>'price')::NUMERIC AS price
+        FROM properties 
+        WHERE data @> '{"property_type": "house"}'  -- GIN index
+          AND data ? 'price'                        -- Partial index predicate
+          AND (data->>'price')::NUMERIC < 500000    -- Expression index
+          AND user_id = 123                         -- B-tree index
+          AND tags @> ARRAY['garage'];              -- Array GIN index
+        ```
+        
+        **🔢 Counting Rows:**
+        - Metric tiles and table status come from the `get_portal_counts` / `get_table_stats` RPCs: one
+          round-trip reading `pg_class.reltuples` (summed over partitions), with an exact `count(*)` for
+          small or never-analyzed tables so a fresh demo database doesn't show zeros
+        - Until those RPCs are installed, the app falls back to per-table `count="estimated"` HEAD requests
+          (Content-Range header only, no rows): PostgREST counts exactly while the total stays under
+          `db-max-rows` and switches to the planner's `EXPLAIN` row estimate above it
+        - `count="exact"` runs `SELECT count(*)`, a full scan - reserve it for the "Recompute exact counts" button
+        - Estimates are only as fresh as the last `ANALYZE`; autovacuum's defaults keep them within a few percent
+        """)
 
 # Function to get table info
+@st.cache_data(ttl=60, show_spinner=False)
 def get_table_info(table_name):
     """Get basic info about a table"""
     try:
-        result = supabase.table(table_name).select("*", count="exact").limit(0).execute()
+        result = supabase.table(table_name).select(ROW_KEYS.get(table_name, "id"), count="estimated", head=True).execute()
         return {"exists": True, "count": result.count}
     except Exception:
         return {"exists": False, "count": 0}
@@ -270,18 +1023,247 @@ def execute_sql_statement(sql_statement, description="SQL statement"):
     except Exception as e:
         return {"success": False, "message": f"Error in {description}: {str(e)}"}
 
+def apply_schema(statements: list) -> dict:
+    """Apply DDL statements in a single transaction via the `apply_schema` RPC"""
+    try:
+        supabase.rpc("apply_schema", {"sqls": statements}).execute()
+        return {"success": True, "message": f"{len(statements)} statements applied"}
+    except Exception as e:
+        return {"success": False, "message": str(e)}
+
+# ------------------------
+# Cached Data Helpers
+# ------------------------
+# `supabase` is a module-level resource from `init_client`, so only hashable
+# arguments (table names, limits) make up the cache keys below.
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_data(table: str, page: int = 1, page_size: int = 50, include_json: bool = False):
+    """Fetch one page of a table (latest rows first) and its total row count"""
+    # Errors propagate to the caller so failed fetches are never cached
+    offset = (page - 1) * page_size
+    columns = "*" if include_json else TABLE_COLUMNS.get(table, "*")
+    data = (
+        supabase.table(table)
+        .select(columns, count="estimated")
+        .order("created_at", desc=True)
+        .order(ROW_KEYS.get(table, "id"), desc=True)
+        .range(offset, offset + page_size - 1)
+        .execute()
+    )
+    records = data.data
+    if include_json and records and table in TABLE_JSON_COLUMNS:
+        # User-entered JSONB mixes types across rows, which Arrow can't infer one column type for
+        json_columns = TABLE_JSON_COLUMNS[table].split(",")
+        records = [
+            {k: orjson.dumps(v).decode() if k in json_columns and v is not None else v for k, v in record.items()}
+            for record in records
+        ]
+    # Build Arrow directly; st.dataframe accepts it without a pandas round-trip
+    rows = pa.Table.from_pylist(records) if records else pa.table({})
+    return rows, data.count if data.count else 0
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_row_json(table: str, row_id: int) -> dict:
+    """Fetch the JSONB columns of a single row"""
+    result = supabase.table(table).select(TABLE_JSON_COLUMNS[table]).eq(ROW_KEYS.get(table, "id"), row_id).single().execute()
+    return result.data
+
+def parallel_queries(callables, max_workers=8):
+    """Run independent Supabase queries concurrently so their round-trips overlap"""
+    # supabase-py sits on a thread-safe httpx session, so the shared client is safe here
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda query: query(), callables))
+
+def _count_table(table: str, count: str = "estimated") -> int:
+    """Uncached row count, safe to call from worker threads
+
+    HEAD request, so only the Content-Range header comes back; "estimated" lets
+    PostgREST use planner statistics instead of a full COUNT(*) on large tables.
+    """
+    result = supabase.table(table).select(ROW_KEYS.get(table, "id"), count=count, head=True).execute()
+    return result.count if result.count else 0
+
+@st.cache_data(ttl=30, show_spinner=False)
+def count_rows(table: str, count: str = "estimated") -> int:
+    """Count the rows of a table, cached so reruns don't re-hit Postgres"""
+    return _count_table(table, count)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def portal_counts(exact: bool = False) -> dict:
+    """Fetch the Analytics tab counts in a single `get_portal_counts` RPC round-trip"""
+    try:
+        return supabase.rpc("get_portal_counts", {"exact": exact}).execute().data
+    except Exception:
+        # Fall back to concurrent per-table counts until the RPC function is installed
+        tables = ("users", "properties", "api_usage", "market_alerts")
+        count = "exact" if exact else "estimated"
+        counts = parallel_queries([lambda t=t: _count_table(t, count) for t in tables])
+        return dict(zip(tables, counts))
+
+@st.cache_data(ttl=30, show_spinner=False)
+def latest_timestamp(table: str):
+    """Newest created_at via a one-row indexed lookup instead of scanning a fetched page"""
+    result = (
+        supabase.table(table)
+        .select("created_at")
+        .order("created_at", desc=True)
+        .limit(1)
+        .maybe_single()
+        .execute()
+    )
+    return result.data["created_at"] if result and result.data else None
+
+@st.cache_data(ttl=30, show_spinner=False)
+def distinct_user_count(table: str) -> int:
+    """Distinct user_id count for the whole table, computed in Postgres"""
+    return supabase.rpc("count_distinct_user_ids", {"table_name": table}).execute().data
+
+def bulk_insert(table: str, rows: list, chunk: int = 500, on_conflict: str = None) -> int:
+    """Insert rows in chunks, one round-trip per chunk, to stay under PostgREST's payload limit
+
+    With `on_conflict`, rows whose key already exists are skipped (ON CONFLICT DO NOTHING), so
+    re-runs are idempotent and duplicate keys within one chunk don't abort the statement.
+    Bodies go out orjson-encoded and nothing is echoed back (`return=minimal`); the number of
+    rows actually written still comes back in the Content-Range header (`count=exact`).
+    """
+    written = 0
+    for start in range(0, len(rows), chunk):
+        batch = rows[start:start + chunk]
+        if on_conflict:
+            result = supabase.table(table).upsert(
+                batch, on_conflict=on_conflict, ignore_duplicates=True,
+                returning=ReturnMethod.minimal, count="exact"
+            ).execute()
+        else:
+            result = supabase.table(table).insert(batch, returning=ReturnMethod.minimal, count="exact").execute()
+        written += result.count or 0
+    return written
+
+def bulk_insert_properties(rows: list, chunk: int = 500) -> int:
+    """Seed properties through the `bulk_insert_properties` RPC; returns how many rows were new"""
+    inserted = 0
+    for start in range(0, len(rows), chunk):
+        result = supabase.rpc("bulk_insert_properties", {"items": rows[start:start + chunk]}).execute()
+        inserted += result.data or 0
+    return inserted
+
+@st.cache_data(ttl=60, show_spinner=False)
+def table_stats(names: tuple) -> dict:
+    """Map each existing table in `names` to its estimated row count via one RPC"""
+    result = supabase.rpc("get_table_stats", {"names": list(names)}).execute()
+    return {row["name"]: row["est_rows"] for row in result.data}
+
+@st.cache_data(ttl=30, show_spinner=False)
+def table_status_snapshot() -> dict:
+    """{table: {"exists": bool, "count": int}} for every portal table, shared by both status views"""
+    try:
+        stats = table_stats(TABLES)
+        return {t: {"exists": t in stats, "count": stats.get(t, 0)} for t in TABLES}
+    except Exception:
+        # get_table_stats not installed yet - probe each table
+        return {t: get_table_info(t) for t in TABLES}
+
+@st.cache_data(ttl=120, show_spinner=False)
+def probe_connection() -> tuple:
+    """(ok, users_count) from one headless users count - a single round-trip per 2 minutes"""
+    result = supabase.table("users").select("id", count="estimated", head=True).execute()
+    return True, result.count or 0
+
+@st.cache_data(ttl=300, show_spinner=False)
+def property_type_summary():
+    """Per-property-type aggregates read from the pre-computed `portal_analytics_mv`"""
+    result = supabase.table("portal_analytics_mv").select("*").order("properties", desc=True).execute()
+    return pa.Table.from_pylist(result.data) if result.data else pa.table({})
+
+# Materialized views built from properties. pg_cron refreshes them on a schedule only where it is
+# installed (Supabase leaves it off by default), so the app also refreshes them after property writes
+ANALYTICS_VIEW_REFRESHES = ("refresh_portfolio_analytics", "refresh_portal_analytics")
+
+def refresh_analytics_views() -> None:
+    """Refresh the property-derived materialized views after a write to properties"""
+    for function_name in ANALYTICS_VIEW_REFRESHES:
+        try:
+            supabase.rpc(function_name).execute()
+        except APIError as e:
+            # PGRST202: refresh function not installed yet - nothing to refresh
+            if e.code != "PGRST202":
+                st.warning(f"Analytics not refreshed ({function_name}): {e.message}")
+
+def invalidate_data_caches() -> None:
+    """Drop cached reads after a write so the next render refetches only what changed"""
+    fetch_data.clear()
+    fetch_row_json.clear()
+    count_rows.clear()
+    portal_counts.clear()
+    latest_timestamp.clear()
+    distinct_user_count.clear()
+    get_table_info.clear()
+    table_stats.clear()
+    table_status_snapshot.clear()
+    probe_connection.clear()
+    property_type_summary.clear()
+    # Data changed, so give the Analytics metrics another try
+    st.session_state.pop("metrics_disabled", None)
+
+@st.cache_data(show_spinner=False)
+def build_complete_sql(include_rls: bool = True) -> str:
+    """Assemble the full schema script once; reruns reuse the cached string"""
+    parts = [
+        "-- Real Estate Portal Database Schema",
+        "-- FIXED VERSION with proper GIN index syntax",
+        "-- Copy and paste this into your Supabase SQL Editor",
+        "",
+        "-- EXTENSIONS",
+        TABLE_SCHEMAS["extensions"],
+        "",
+        "-- TABLES",
+    ]
+    for table_name, sql in TABLE_SCHEMAS.items():
+        if table_name != "extensions":
+            parts += [f"-- {table_name.upper()} TABLE", sql, ""]
+    
+    parts += [
+        "-- PERFORMANCE INDEXES",
+        "-- Basic B-tree indexes",
+    ]
+    parts += [INDEX_SCHEMAS[k] for k in _BASIC_KEYS]
+    parts += ["", "-- GIN indexes for JSONB and array columns"]
+    parts += [INDEX_SCHEMAS[k] for k in _GIN_KEYS]
+    parts += ["", "-- Expression indexes for common JSONB queries"]
+    parts += [INDEX_SCHEMAS[k] for k in _EXPR_KEYS]
+    
+    parts += ["", "-- RPC FUNCTIONS"]
+    parts += list(FUNCTION_SCHEMAS.values())
+    
+    if include_rls:
+        parts += ["", "-- ROW LEVEL SECURITY (Optional - only enable with authentication)"]
+        for table_name, sql in RLS_POLICIES.items():
+            parts += [f"-- RLS for {table_name}", sql]
+    
+    return "\n".join(parts) + "\n"
+
+@st.cache_data(show_spinner=False)
+def build_online_index_sql() -> str:
+    """Assemble the CONCURRENTLY index builds for an already-populated database"""
+    parts = [
+        "-- Online index builds (CREATE INDEX CONCURRENTLY) - no write locks on live tables",
+        "-- CONCURRENTLY cannot run inside a transaction block or a multi-statement batch:",
+        "-- execute ONE statement per run in the SQL Editor",
+        "",
+    ]
+    parts += list(ONLINE_INDEX_SCHEMAS.values())
+    return "\n".join(parts) + "\n"
+
 # Enhanced Schema Creation UI
 st.sidebar.subheader("🔧 Database Schema Management")
 
 # Table status overview
 if st.sidebar.button("📊 Check Table Status"):
     st.sidebar.write("**Table Status:**")
-    for table_name in TABLE_SCHEMAS.keys():
-        if table_name == "extensions":
-            continue
-        info = get_table_info(table_name)
+    for table_name, info in table_status_snapshot().items():
         if info["exists"]:
-            st.sidebar.write(f"✅ {table_name}: {info['count']} records")
+            st.sidebar.write(f"✅ {table_name}: ~{info['count']} records")
         else:
             st.sidebar.write(f"❌ {table_name}: Missing")
 
@@ -293,58 +1275,46 @@ if st.sidebar.button("🚀 Create All Tables & Indexes"):
     progress_bar = st.sidebar.progress(0)
     status_text = st.sidebar.empty()
     
-    # Create extension
-    try:
-        status_text.text("Creating extensions...")
-        progress_bar.progress(5)
-        result = execute_sql_statement(TABLE_SCHEMAS["extensions"], "Extensions")
-        if result["success"]:
-            st.sidebar.success("✅ Extensions ready")
-        else:
-            st.sidebar.error(f"❌ Extensions: {result['message']}")
-    except Exception as e:
-        st.sidebar.error(f"❌ Extensions failed: {str(e)[:50]}...")
-    
-    # Create tables
-    total_tables = len(TABLE_SCHEMAS) - 1  # excluding extensions
-    for i, (table_name, sql) in enumerate(TABLE_SCHEMAS.items()):
-        if table_name == "extensions":
-            continue
-            
-        try:
-            status_text.text(f"Creating {table_name}...")
-            progress_bar.progress(5 + (i * 40 // total_tables))
-            result = execute_sql_statement(sql, f"Table {table_name}")
-            if result["success"]:
-                st.sidebar.success(f"✅ {table_name}")
-            else:
-                st.sidebar.error(f"❌ {table_name}: {result['message']}")
-        except Exception as e:
-            st.sidebar.error(f"❌ {table_name}: {str(e)[:30]}...")
+    # Extensions and tables in one transactional round-trip - all created or none
+    status_text.text("Creating extensions and tables...")
+    progress_bar.progress(5)
+    result = apply_schema(list(TABLE_SCHEMAS.values()))
+    progress_bar.progress(45)
+    if result["success"]:
+        st.sidebar.success(f"✅ Extensions and {len(TABLE_SCHEMAS) - 1} tables ready")
+    else:
+        st.sidebar.error(f"❌ Tables: {result['message'][:80]}")
     
-    # Create indexes with better error handling
+    # Plain (non-concurrent) index DDL, so it can share apply_schema's transaction; must precede
+    # the functions because the CONCURRENTLY view refreshes need the unique indexes
     try:
         status_text.text("Creating indexes...")
         progress_bar.progress(60)
         
-        failed_indexes = []
-        successful_indexes = []
-        
-        for index_name, sql in INDEX_SCHEMAS.items():
-            result = execute_sql_statement(sql, f"Index {index_name}")
-            if result["success"]:
-                successful_indexes.append(index_name)
-            else:
-                failed_indexes.append((index_name, result["message"]))
-        
-        if successful_indexes:
-            st.sidebar.success(f"✅ {len(successful_indexes)} indexes ready")
-        if failed_indexes:
-            st.sidebar.warning(f"⚠️ {len(failed_indexes)} indexes had issues")
+        result = apply_schema(list(INDEX_SCHEMAS.values()))
+        if result["success"]:
+            st.sidebar.success(f"✅ {len(INDEX_SCHEMAS)} indexes ready")
+        else:
+            st.sidebar.error(f"❌ Indexes: {result['message'][:80]}")
             
     except Exception as e:
         st.sidebar.error(f"❌ Indexes failed: {str(e)[:50]}...")
     
+    # Create RPC functions
+    try:
+        status_text.text("Creating functions...")
+        progress_bar.progress(75)
+        
+        # apply_schema can't safely replace itself mid-call; it is bootstrapped from the SQL editor
+        function_sqls = [sql for name, sql in FUNCTION_SCHEMAS.items() if name != "apply_schema"]
+        result = apply_schema(function_sqls)
+        if result["success"]:
+            st.sidebar.success(f"✅ {len(function_sqls)} functions ready")
+        else:
+            st.sidebar.error(f"❌ Functions: {result['message'][:80]}")
+    except Exception as e:
+        st.sidebar.error(f"❌ Functions failed: {str(e)[:50]}...")
+    
     # Setup RLS (optional)
     if st.sidebar.checkbox("Enable Row Level Security"):
         try:
@@ -362,48 +1332,20 @@ if st.sidebar.button("🚀 Create All Tables & Indexes"):
     progress_bar.progress(100)
     status_text.text("✅ Database setup complete!")
     
+    # Table status may have changed - don't serve the cached "Missing" results
+    get_table_info.clear()
+    table_stats.clear()
+    table_status_snapshot.clear()
+    portal_counts.clear()
+    st.session_state.pop("metrics_disabled", None)
+    
     st.sidebar.info("💡 Copy SQL commands below to run in Supabase SQL editor")
 
 # Show complete SQL for manual execution
 if st.sidebar.button("📋 Show Complete SQL"):
     st.sidebar.info("Copy this SQL to your Supabase SQL Editor:")
     
-    complete_sql = """-- Real Estate Portal Database Schema
--- FIXED VERSION with proper GIN index syntax
--- Copy and paste this into your Supabase SQL Editor
-
-"""
-    
-    # Add extension
-    complete_sql += "-- EXTENSIONS\n"
-    complete_sql += TABLE_SCHEMAS["extensions"] + "\n\n"
-    
-    # Add all tables
-    complete_sql += "-- TABLES\n"
-    for table_name, sql in TABLE_SCHEMAS.items():
-        if table_name != "extensions":
-            complete_sql += f"-- {table_name.upper()} TABLE\n{sql}\n\n"
-    
-    # Add indexes with better organization
-    complete_sql += "-- PERFORMANCE INDEXES\n"
-    complete_sql += "-- Basic B-tree indexes\n"
-    basic_indexes = [k for k in INDEX_SCHEMAS.keys() if not any(x in k for x in ['gin', 'price', 'bedrooms', 'property_type'])]
-    for index_name in basic_indexes:
-        complete_sql += f"{INDEX_SCHEMAS[index_name]}\n"
-    
-    complete_sql += "\n-- GIN indexes for JSONB and array columns\n"
-    gin_indexes = [k for k in INDEX_SCHEMAS.keys() if 'gin' in k]
-    for index_name in gin_indexes:
-        complete_sql += f"{INDEX_SCHEMAS[index_name]}\n"
-    
-    complete_sql += "\n-- Expression indexes for common JSONB queries\n"
-    expression_indexes = [k for k in INDEX_SCHEMAS.keys() if any(x in k for x in ['price', 'bedrooms', 'property_type'])]
-    for index_name in expression_indexes:
-        complete_sql += f"{INDEX_SCHEMAS[index_name]}\n"
-        
-    complete_sql += "\n-- ROW LEVEL SECURITY (Optional - only enable with authentication)\n"
-    for table_name, sql in RLS_POLICIES.items():
-        complete_sql += f"-- RLS for {table_name}\n{sql}\n"
+    complete_sql = build_complete_sql()
     
     # Display in expandable section
     with st.expander("📋 Complete Database Schema SQL (FIXED)", expanded=False):
@@ -496,7 +1438,7 @@ with tab1:
         -- Find properties with specific features (optimized)
         SELECT * FROM properties 
         WHERE data @> '{"property_type": "condo"}'
-          AND 'parking' = ANY(tags);
+          AND tags @> ARRAY['parking'];
         ```
         """)
     
@@ -526,10 +1468,10 @@ with tab1:
         -- or just: USING GIN (jsonb_column)  -- defaults to jsonb_ops
         ```
         
-        **✅ Supports ALL operators:**
-        - `@>`, `<@` (containment)
+        **✅ Supports every indexable jsonb operator:**
+        - `@>` (containment), `@?`, `@@` (jsonpath)
         - `?`, `?&`, `?|` (key existence)  
-        - `#>`, `#>>` (path extraction)
+        - Path extraction (`->`, `#>`, `#>>`) is never GIN-indexed - use B-tree expression indexes
         
         **❌ Trade-offs:**
         - Larger index size
@@ -596,6 +1538,12 @@ with tab1:
         **Option B: Use the Setup Tools**
         - Use the sidebar tools to check table status and generate SQL
         - Download the fixed schema file for manual execution
+        
+        **Upgrading an existing database:** the schema script migrates older layouts in place -
+        a plain `api_usage` table is copied into the monthly-partitioned one, `properties.property_hash`
+        becomes a generated `UUID` column unique per user, and a plain `portfolio_analytics` table is
+        replaced by the materialized view. Remove any user's properties with identical `data` first,
+        or the unique `(user_id, property_hash)` key can't be added and the script rolls back.
         """)
         
         # Quick setup buttons
@@ -603,32 +1551,16 @@ with tab1:
         with col1:
             if st.button("📊 Check Current Database Status", key="check_status"):
                 st.write("**Current Table Status:**")
-                for table_name in ["users", "properties", "api_usage", "market_alerts", "saved_searches", 
-                                 "user_sessions", "property_comparisons", "user_preferences", "portfolio_analytics"]:
-                    info = get_table_info(table_name)
+                for table_name, info in table_status_snapshot().items():
                     if info["exists"]:
                         st.success(f"✅ {table_name}: {info['count']} records")
                     else:
                         st.error(f"❌ {table_name}: Not found")
         
         with col2:
-            # Generate complete setup SQL with fixes
-            complete_sql = """-- Real Estate Portal Database Schema - FIXED VERSION
--- Copy this to your Supabase SQL Editor
-
--- EXTENSIONS
-CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
-
-"""
+            # Same assembled schema as the sidebar, minus the optional RLS section
+            complete_sql = build_complete_sql(include_rls=False)
             
-            for table_name, sql in TABLE_SCHEMAS.items():
-                if table_name != "extensions":
-                    complete_sql += f"-- {table_name.upper()} TABLE\n{sql}\n\n"
-            
-            complete_sql += "-- PERFORMANCE INDEXES (FIXED)\n"
-            for index_name, sql in INDEX_SCHEMAS.items():
-                complete_sql += f"{sql}\n"
-                
             st.download_button(
                 label="📥 Download FIXED Schema SQL",
                 data=complete_sql,
@@ -637,10 +1569,20 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
                 help="Download the complete FIXED SQL to run in Supabase SQL Editor"
             )
         
-        # Show the FIXED SQL in an expandable code block
-        st.markdown("**Complete Database Schema (FIXED):**")
-        st.code(complete_sql, language="sql", line_numbers=True)
-    
+        # Only ship the full schema to the browser when it is asked for
+        if st.checkbox("Show complete schema SQL", key="show_schema_sql"):
+            st.markdown("**Complete Database Schema (FIXED):**")
+            st.code(complete_sql, language="sql", line_numbers=True)
+
+        # Adding indexes to a database that already holds data
+        if st.checkbox("Show online index builds (live databases)", key="show_online_index_sql"):
+            st.markdown("""
+            The schema script above builds indexes with plain `CREATE INDEX`, which is fine on empty tables.
+            On a live database use these `CONCURRENTLY` variants instead so writes aren't blocked -
+            **run one statement per execution**; they fail inside a transaction or a multi-statement batch.
+            """)
+            st.code(build_online_index_sql(), language="sql")
+
     # Step 3: Index Details
     with st.expander("📊 Understanding the Fixed Indexes", expanded=False):
         st.markdown("""
@@ -653,10 +1595,10 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
         
         **2. GIN Indexes (FIXED):**
         ```sql
-        -- Full JSONB document search
-        CREATE INDEX idx_properties_data_gin ON properties USING GIN (data);
+        -- JSONB containment (@>) search with the compact jsonb_path_ops class
+        CREATE INDEX idx_properties_data_gin ON properties USING GIN (data jsonb_path_ops);
         
-        -- Array operations  
+        -- Array operations (default array_ops)
         CREATE INDEX idx_properties_tags_gin ON properties USING GIN (tags);
         ```
         
@@ -673,11 +1615,11 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
         -- Uses GIN index
         SELECT * FROM properties WHERE data @> '{"property_type": "house"}';
         
-        -- Uses expression index
-        SELECT * FROM properties WHERE (data->>'price')::NUMERIC > 500000;
+        -- Uses expression index (repeat the partial-index predicate so the planner can match it)
+        SELECT * FROM properties WHERE data ? 'price' AND (data->>'price')::NUMERIC > 500000;
         
         -- Uses array GIN index
-        SELECT * FROM properties WHERE 'pool' = ANY(tags);
+        SELECT * FROM properties WHERE tags @> ARRAY['pool'];
         ```
         """)
     
@@ -697,14 +1639,13 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
         if url and key:
             st.success("✅ Supabase credentials provided")
             try:
-                # Try a simple query to test connection
-                result = supabase.table("users").select("*").limit(1).execute()
+                # Cached probe: connection check and user count in one query
+                ok, users_count = probe_connection()
                 st.success("✅ Database connection successful!")
                 
                 # Check if we have data
-                users_count = supabase.table("users").select("*", count="exact").limit(0).execute()
-                if users_count.count > 0:
-                    st.info(f"📊 Found {users_count.count} users in database")
+                if users_count > 0:
+                    st.info(f"📊 Found ~{users_count} users in database")
                 else:
                     st.warning("⚡ Database is empty - add some sample data in the 'Data Entry' tab")
                     
@@ -720,169 +1661,102 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 # Tab 1: Data Viewer & Editor
 # ------------------------
 with tab2:
-    tables = [
-        "users", "api_usage", "properties", "user_sessions",
-        "market_alerts", "property_comparisons", "user_preferences",
-        "portfolio_analytics", "saved_searches"
-    ]
-    choice = st.selectbox("Choose Table", tables)
+    choice = st.selectbox("Choose Table", TABLES)
     
     st.subheader(f"📊 {choice.capitalize()} Data")
     
-    def fetch_data(table, limit=100):
-        try:
-            data = supabase.table(table).select("*").limit(limit).execute()
-            return pd.DataFrame(data.data) if data.data else pd.DataFrame()
-        except Exception as e:
-            st.error(f"Fetch error: {e}")
-            return pd.DataFrame()
-    
-    # Fetch controls
-    col1, col2, col3 = st.columns([2, 1, 1])
+    # Fetch controls - one server-side page per interaction
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
     with col1:
-        limit = st.slider("Records to fetch", 10, 500, 100)
+        page_size = st.selectbox("Page size", [25, 50, 100], index=1)
     with col2:
-        if st.button("🔄 Refresh"):
-            st.cache_data.clear()
+        page = st.number_input("Page", min_value=1, value=1, step=1)
     with col3:
+        if st.button("🔄 Refresh"):
+            invalidate_data_caches()
+    with col4:
         show_sql = st.checkbox("Show SQL")
     
-    df = fetch_data(choice, limit)
-    
-    if show_sql:
-        st.code(f"SELECT * FROM {choice} LIMIT {limit};", language="sql")
+    include_json = st.sidebar.checkbox("Include JSONB payloads", value=False,
+                                       help="Fetch full JSONB columns in the Data Viewer (larger payloads)")
     
-    if df.empty:
-        st.info(f"No records in {choice} table yet.")
-    else:
-        st.dataframe(df, use_container_width=True)
-        
-        # Quick stats
-        st.subheader("📈 Quick Stats")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Total Records", len(df))
-        with col2:
-            if 'created_at' in df.columns:
-                latest = pd.to_datetime(df['created_at']).max()
-                st.metric("Latest Record", latest.strftime('%Y-%m-%d'))
-        with col3:
-            if 'user_id' in df.columns:
-                unique_users = df['user_id'].nunique()
-                st.metric("Unique Users", unique_users)
-
-# [Continue with the remaining tabs - SQL Queries, Data Entry, Analytics...]
-# [The code for these tabs remains exactly the same as the original]
-
-# ------------------------
-# Tab 2: SQL Queries
-# ------------------------
-with tab3:
-    st.subheader("🔍 Direct SQL Query Interface")
+    try:
+        rows, total_rows = fetch_data(choice, int(page), page_size, include_json)
+    except Exception as e:
+        st.error(f"Fetch error: {e}")
+        rows, total_rows = pa.table({}), 0
     
-    # Predefined queries with FIXED syntax examples
-    st.subheader("📚 Example Queries (Using Fixed Indexes)")
+    if show_sql:
+        columns = "*" if include_json else TABLE_COLUMNS.get(choice, "*").replace(",", ", ")
+        offset = (int(page) - 1) * page_size
+        st.code(f"SELECT {columns} FROM {choice} ORDER BY created_at DESC, {ROW_KEYS.get(choice, 'id')} DESC LIMIT {page_size} OFFSET {offset};", language="sql")
     
-    query_examples = {
-        "User Activity Summary": """
-SELECT 
-    u.email,
-    u.full_name,
-    u.role,
-    COUNT(p.id) as total_properties,
-    COUNT(au.id) as api_calls,
-    MAX(au.created_at) as last_activity
-FROM users u
-LEFT JOIN properties p ON u.id = p.user_id
-LEFT JOIN api_usage au ON u.id = au.user_id
-GROUP BY u.id, u.email, u.full_name, u.role
-ORDER BY total_properties DESC;
-        """,
-        
-        "Properties by Price Range (Uses Expression Index)": """
-SELECT 
-    CASE 
-        WHEN (data->>'price')::NUMERIC < 200000 THEN 'Under $200k'
-        WHEN (data->>'price')::NUMERIC < 500000 THEN '$200k - $500k'
-        WHEN (data->>'price')::NUMERIC < 1000000 THEN '$500k - $1M'
-        ELSE 'Over $1M'
-    END as price_range,
-    COUNT(*) as property_count,
-    AVG((data->>'price')::NUMERIC) as avg_price
-FROM properties 
-WHERE data ? 'price'  -- Uses GIN index to check if price field exists
-GROUP BY price_range
-ORDER BY AVG((data->>'price')::NUMERIC);
-        """,
-        
-        "JSONB Search Examples (Uses GIN Index)": """
--- Find houses with pools (uses GIN index on data)
-SELECT data->>'address', data->>'price', data->>'property_type'
-FROM properties 
-WHERE data @> '{"property_type": "house"}' 
-  AND 'pool' = ANY(tags);
-        """,
-        
-        "API Usage Analytics": """
-SELECT 
-    DATE(created_at) as date,
-    query_type,
-    COUNT(*) as query_count,
-    AVG(response_time_ms) as avg_response_time,
-    COUNT(*) FILTER (WHERE success = false) as failed_queries
-FROM api_usage 
-WHERE created_at >= NOW() - INTERVAL '30 days'
-GROUP BY DATE(created_at), query_type
-ORDER BY date DESC, query_count DESC;
-        """,
-        
-        "User Favorites & Notes": """
-SELECT 
-    u.email,
-    p.data->>'address' as property_address,
-    p.data->>'price' as price,
-    p.notes,
-    p.tags,
-    p.created_at as saved_date
-FROM properties p
-JOIN users u ON p.user_id = u.id
-WHERE p.is_favorite = true OR p.notes IS NOT NULL
-ORDER BY p.created_at DESC;
-        """,
-        
-        "Market Alert Summary": """
-SELECT 
-    ma.alert_name,
-    ma.alert_type,
-    ma.location,
-    ma.criteria,
-    ma.threshold,
-    ma.is_active,
-    u.email as user_email,
-    ma.last_triggered
-FROM market_alerts ma
-JOIN users u ON ma.user_id = u.id
-ORDER BY ma.created_at DESC;
-        """,
-        
-        "Property Search Patterns": """
-SELECT 
-    p.search_params->>'location' as search_location,
-    p.search_params->>'property_type' as property_type,
-    COUNT(*) as search_count,
-    AVG((p.data->>'price')::NUMERIC) as avg_price_found
-FROM properties p
-WHERE p.search_params IS NOT NULL
-GROUP BY p.search_params->>'location', p.search_params->>'property_type'
-HAVING COUNT(*) > 1
-ORDER BY search_count DESC;
-        """
-    }
+    if rows.num_rows == 0:
+        st.info(f"No records in {choice} table yet.")
+    else:
+        total_pages = max(1, -(-total_rows // page_size))
+        st.caption(f"Page {int(page)} of ~{total_pages}")
+        
+        # Keep any JSONB or array cells compact; full payloads load per row below
+        column_config = {
+            column: st.column_config.Column(width="small", help="Use 🔎 View JSON to load this payload")
+            for column in TABLE_JSON_COLUMNS.get(choice, "").split(",") if column
+        }
+        if "tags" in rows.column_names:
+            column_config["tags"] = st.column_config.ListColumn(width="medium")
+        st.dataframe(rows, column_config=column_config, use_container_width=True)
+        
+        # JSONB payloads are only fetched for the row the user asks for
+        if choice in TABLE_JSON_COLUMNS:
+            with st.expander("🔎 View JSON", expanded=False):
+                row_id = st.selectbox("Row ID", rows[ROW_KEYS.get(choice, 'id')].to_pylist(), key="json_row_id")
+                if st.button("Load JSON", key="load_row_json"):
+                    try:
+                        st.json(fetch_row_json(choice, int(row_id)))
+                    except Exception as e:
+                        st.error(f"Fetch error: {e}")
+        
+        # Quick stats
+        st.subheader("📈 Quick Stats")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Total Rows (est.)", total_rows)
+        with col2:
+            if 'created_at' in rows.column_names:
+                try:
+                    latest = latest_timestamp(choice)
+                except Exception:
+                    # Rows arrive ORDER BY created_at DESC, so the first row is the latest on this page
+                    latest = rows['created_at'][0].as_py()
+                if latest:
+                    # ISO-8601 from PostgREST: the date is the first 10 characters, no parsing needed
+                    st.metric("Latest Record", str(latest)[:10])
+        with col3:
+            if 'user_id' in rows.column_names:
+                try:
+                    unique_users = distinct_user_count(choice)
+                except Exception:
+                    # RPC not installed yet - fall back to the current page
+                    unique_users = pc.count_distinct(rows['user_id']).as_py()
+                st.metric("Unique Users", unique_users)
+
+# [Continue with the remaining tabs - SQL Queries, Data Entry, Analytics...]
+# [The code for these tabs remains exactly the same as the original]
+
+# ------------------------
+# Tab 2: SQL Queries
+# ------------------------
+with tab3:
+    st.subheader("🔍 Direct SQL Query Interface")
+    
+    # Predefined queries with FIXED syntax examples
+    st.subheader("📚 Example Queries (Using Fixed Indexes)")
     
-    selected_query = st.selectbox("Choose Example Query", list(query_examples.keys()))
+    
+    selected_query = st.selectbox("Choose Example Query", list(QUERY_EXAMPLES))
     
     if selected_query:
-        st.code(query_examples[selected_query], language="sql")
+        st.code(QUERY_EXAMPLES[selected_query], language="sql")
         if st.button(f"▶️ Run {selected_query}"):
             try:
                 # Note: In production, you'd need an RPC function to execute arbitrary SQL
@@ -913,132 +1787,7 @@ $ LANGUAGE plpgsql SECURITY DEFINER;
     
         # SQL Tips optimized for jsonb_path_ops
     with st.expander("💡 SQL Tips for Real Estate Data (OPTIMIZED with jsonb_path_ops)", expanded=True):
-        st.markdown("""
-        **🚀 OPTIMAL JSONB Query Patterns (Using jsonb_path_ops indexes):**
-        
-        **⭐ SUPER FAST - Uses jsonb_path_ops GIN index:**
-        ```sql
-        -- Property type filtering (lightning fast)
-        WHERE data @> '{"property_type": "house"}'
-        
-        -- Multi-criteria property search (optimized)
-        WHERE data @> '{"property_type": "house", "bedrooms": 3}'
-        WHERE data @> '{"bathrooms": 2, "property_type": "condo"}'
-        
-        -- Nested feature searches (excellent performance)
-        WHERE data @> '{"features": {"pool": true}}'
-        WHERE data @> '{"amenities": {"garage": true, "fireplace": true}}'
-        
-        -- Complex containment queries
-        WHERE search_params @> '{"location": "Seattle", "max_price": 500000}'
-        WHERE criteria @> '{"alert_type": "price_drop"}'
-        ```
-        
-        **⚡ FAST - Uses B-tree expression indexes:**
-        ```sql
-        -- Numeric range queries (uses expression indexes)
-        WHERE (data->>'price')::NUMERIC BETWEEN 200000 AND 500000
-        WHERE (data->>'bedrooms')::INTEGER >= 3
-        WHERE (data->>'bathrooms')::NUMERIC >= 2.5
-        WHERE (data->>'sqft')::INTEGER > 1500
-        
-        -- Text equality (uses expression indexes)
-        WHERE data->>'property_type' = 'house'
-        WHERE data->>'city' = 'Seattle'
-        ```
-        
-        **🔍 FAST - Uses array GIN indexes:**
-        ```sql
-        -- Tag/feature searches (array operations)
-        WHERE 'pool' = ANY(tags)
-        WHERE 'garage' = ANY(tags) AND 'fireplace' = ANY(tags)
-        WHERE tags @> ARRAY['pool', 'garage']        -- contains all
-        WHERE tags && ARRAY['pool', 'spa', 'deck']   -- overlaps any
-        ```
-        
-        **📝 FAST - Uses full-text search GIN:**
-        ```sql
-        -- Text search in queries/descriptions
-        WHERE to_tsvector('english', query) @@ to_tsquery('seattle & house')
-        WHERE to_tsvector('english', location) @@ plainto_tsquery('downtown seattle')
-        ```
-        
-        **🏠 Real Estate Query Examples (OPTIMIZED):**
-        
-        **Find luxury houses with pools:**
-        ```sql
-        SELECT * FROM properties 
-        WHERE data @> '{"property_type": "house"}'           -- jsonb_path_ops GIN
-          AND (data->>'price')::NUMERIC > 750000             -- B-tree expression  
-          AND 'pool' = ANY(tags)                             -- Array GIN
-          AND user_id = 123;                                 -- B-tree
-        ```
-        
-        **Search condos in price range with parking:**
-        ```sql
-        SELECT * FROM properties
-        WHERE data @> '{"property_type": "condo"}'           -- jsonb_path_ops GIN
-          AND (data->>'price')::NUMERIC BETWEEN 300000 AND 600000  -- B-tree expression
-          AND 'parking' = ANY(tags);                         -- Array GIN
-        ```
-        
-        **Market alert matching:**
-        ```sql
-        SELECT ma.*, p.data->>'address' as property_address
-        FROM market_alerts ma
-        JOIN properties p ON p.data @> ma.criteria           -- Both use jsonb_path_ops!
-        WHERE ma.is_active = true 
-          AND (p.data->>'price')::NUMERIC <= ma.threshold;
-        ```
-        
-        **Advanced aggregation with JSONB:**
-        ```sql
-        SELECT 
-          data->>'property_type' as type,
-          data->>'city' as city,
-          COUNT(*) as count,
-          AVG((data->>'price')::NUMERIC) as avg_price,
-          PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY (data->>'price')::NUMERIC) as median_price
-        FROM properties 
-        WHERE data @> '{"bedrooms": 3}'                      -- Fast with jsonb_path_ops
-        GROUP BY data->>'property_type', data->>'city'
-        HAVING COUNT(*) >= 5
-        ORDER BY avg_price DESC;
-        ```
-        
-        **❌ AVOID - Patterns that can't use jsonb_path_ops:**
-        ```sql
-        -- These need jsonb_ops or B-tree expression indexes:
-        WHERE data ? 'price'                    -- Key existence - use B-tree expression
-        WHERE data ?& ARRAY['price', 'beds']    -- Multiple keys - use B-tree expressions  
-        WHERE data ?| ARRAY['pool', 'spa']      -- Any key exists - restructure query
-        
-        -- Better alternatives:
-        WHERE data @> '{}' AND (data->>'price') IS NOT NULL   -- Instead of data ? 'price'
-        WHERE (data->>'price')::NUMERIC > 0                   -- Direct field check
-        ```
-        
-        **🎯 Query Performance Tips:**
-        
-        1. **Lead with containment**: Put `@>` conditions first in WHERE clause
-        2. **Combine indexes**: PostgreSQL can use multiple indexes efficiently  
-        3. **Use EXPLAIN**: Always check query plans for index usage
-        4. **Avoid functions**: Don't wrap indexed columns in functions
-        5. **Order matters**: Most selective conditions first
-        
-        **📈 Example EXPLAIN output:**
-        ```sql
-        EXPLAIN (ANALYZE, BUFFERS) 
-        SELECT * FROM properties 
-        WHERE data @> '{"property_type": "house"}' 
-          AND (data->>'price')::NUMERIC < 500000;
-          
-        -- Expected: 
-        -- Bitmap Index Scan on idx_properties_data_gin
-        -- Bitmap Index Scan on idx_properties_price  
-        -- BitmapAnd of the above
-        ```
-        """)
+        st.markdown(SQL_TIPS_MD)
     
 
 # ------------------------
@@ -1047,9 +1796,7 @@ $ LANGUAGE plpgsql SECURITY DEFINER;
 with tab4:
     st.subheader("➕ Add Sample Data")
     
-    entry_choice = st.selectbox("Choose Table to Add Data", [
-        "users", "properties", "api_usage", "market_alerts", "saved_searches"
-    ])
+    entry_choice = st.selectbox("Choose Table to Add Data", ENTRY_TABLES)
     
     if entry_choice == "users":
         st.subheader("👤 Add New User")
@@ -1066,6 +1813,7 @@ with tab4:
                             "full_name": full_name,
                             "role": role
                         }).execute()
+                        invalidate_data_caches()
                         st.success(f"✅ User added with ID: {result.data[0]['id']}")
                     except Exception as e:
                         st.error(f"Error: {e}")
@@ -1096,14 +1844,16 @@ with tab4:
             notes = st.text_area("Notes")
             is_favorite = st.checkbox("Mark as Favorite")
             
-            if st.form_submit_button("Add Property"):
+            add_clicked = st.form_submit_button("Add Property")
+            queue_clicked = st.form_submit_button("📥 Queue for Batch")
+            
+            if add_clicked or queue_clicked:
                 if address and price > 0:
                     try:
-                        # Create property hash
-                        property_str = f"{address}_{price}_{bedrooms}_{bathrooms}"
-                        property_hash = hashlib.md5(property_str.encode()).hexdigest()
+                        # Parse features once; drop blanks from trailing commas so they don't bloat the tags GIN
+                        feature_list = [f.strip() for f in features.split(",") if f.strip()] if features else []
                         
-                        # Build property data
+                        # Build property data (property_hash is generated from it by Postgres)
                         property_data = {
                             "address": address,
                             "price": price,
@@ -1115,29 +1865,61 @@ with tab4:
                             "lot_size": lot_size
                         }
                         
-                        if features:
-                            property_data["features"] = [f.strip() for f in features.split(",")]
+                        if feature_list:
+                            property_data["features"] = feature_list
                         
-                        result = supabase.table("properties").insert({
+                        row = {
                             "user_id": user_id,
-                            "property_hash": property_hash,
                             "data": property_data,
                             "notes": notes if notes else None,
                             "is_favorite": is_favorite,
-                            "tags": [f.strip() for f in features.split(",")] if features else []
-                        }).execute()
+                            "tags": feature_list
+                        }
                         
-                        st.success(f"✅ Property added with ID: {result.data[0]['id']}")
+                        if queue_clicked:
+                            # Held in the session until "Commit batch" sends them in one request
+                            st.session_state.setdefault("pending_properties", []).append(row)
+                            st.success("📥 Property queued for the next batch commit")
+                        else:
+                            # Upsert on the dedupe key so a resubmit doesn't fail on the UNIQUE constraint
+                            # return=minimal: don't ship the JSONB row back just to show a success message
+                            supabase.table("properties").upsert(
+                                row, on_conflict="user_id,property_hash", returning=ReturnMethod.minimal
+                            ).execute()
+                            
+                            refresh_analytics_views()
+                            invalidate_data_caches()
+                            st.success("✅ Property saved")
                     except Exception as e:
                         st.error(f"Error: {e}")
                 else:
                     st.error("Address and price are required")
+        
+        pending_properties = st.session_state.get("pending_properties", [])
+        if pending_properties:
+            st.info(f"📥 {len(pending_properties)} properties queued")
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("💾 Commit batch"):
+                    try:
+                        # One upsert per chunk instead of a round-trip per property
+                        written = bulk_insert("properties", pending_properties, on_conflict="user_id,property_hash")
+                        del st.session_state["pending_properties"]
+                        refresh_analytics_views()
+                        invalidate_data_caches()
+                        skipped = len(pending_properties) - written
+                        st.success(f"✅ Committed {written} properties" + (f" ({skipped} duplicates skipped)" if skipped else ""))
+                    except Exception as e:
+                        st.error(f"Error committing batch: {e}")
+            with col2:
+                if st.button("🗑️ Clear queue"):
+                    del st.session_state["pending_properties"]
     
     elif entry_choice == "api_usage":
         st.subheader("📊 Log API Usage")
         with st.form("add_api_usage"):
             user_id = st.number_input("User ID*", min_value=1, value=1)
-            query = st.text_input("Query", placeholder="search properties in Seattle")
+            query = st.text_input("Query*", placeholder="search properties in Seattle")
             query_type = st.selectbox("Query Type", [
                 "property_search", "market_analysis", "comparable_properties", 
                 "neighborhood_stats", "price_prediction"
@@ -1147,19 +1929,23 @@ with tab4:
             error_msg = st.text_input("Error Message (if failed)")
             
             if st.form_submit_button("Log API Usage"):
-                try:
-                    result = supabase.table("api_usage").insert({
-                        "user_id": user_id,
-                        "query": query,
-                        "query_type": query_type,
-                        "response_time_ms": response_time,
-                        "success": success,
-                        "error_message": error_msg if error_msg else None,
-                        "metadata": {"timestamp": datetime.utcnow().isoformat()}
-                    }).execute()
-                    st.success(f"✅ API usage logged with ID: {result.data[0]['id']}")
-                except Exception as e:
-                    st.error(f"Error: {e}")
+                if query:
+                    try:
+                        supabase.table("api_usage").insert({
+                            "user_id": user_id,
+                            "query": query,
+                            "query_type": query_type,
+                            "response_time_ms": response_time,
+                            "success": success,
+                            "error_message": error_msg if error_msg else None
+                            # created_at defaults to NOW() server-side, so no client timestamp is sent
+                        }, returning=ReturnMethod.minimal).execute()
+                        invalidate_data_caches()
+                        st.success("✅ API usage logged")
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+                else:
+                    st.error("Query is required")
     
     elif entry_choice == "market_alerts":
         st.subheader("🚨 Add Market Alert")
@@ -1183,7 +1969,7 @@ with tab4:
                 if alert_name and criteria_json:
                     try:
                         # Parse criteria JSON
-                        criteria = json.loads(criteria_json)
+                        criteria = orjson.loads(criteria_json)
                         
                         result = supabase.table("market_alerts").insert({
                             "user_id": user_id,
@@ -1196,8 +1982,9 @@ with tab4:
                             "is_active": is_active
                         }).execute()
                         
+                        invalidate_data_caches()
                         st.success(f"✅ Market alert added with ID: {result.data[0]['id']}")
-                    except json.JSONDecodeError:
+                    except orjson.JSONDecodeError:
                         st.error("Invalid JSON format in criteria")
                     except Exception as e:
                         st.error(f"Error: {e}")
@@ -1221,7 +2008,7 @@ with tab4:
                 if search_name and criteria_json:
                     try:
                         # Parse criteria JSON
-                        criteria = json.loads(criteria_json)
+                        criteria = orjson.loads(criteria_json)
                         
                         result = supabase.table("saved_searches").insert({
                             "user_id": user_id,
@@ -1231,8 +2018,9 @@ with tab4:
                             "results_count": 0
                         }).execute()
                         
+                        invalidate_data_caches()
                         st.success(f"✅ Saved search added with ID: {result.data[0]['id']}")
-                    except json.JSONDecodeError:
+                    except orjson.JSONDecodeError:
                         st.error("Invalid JSON format in search criteria")
                     except Exception as e:
                         st.error(f"Error: {e}")
@@ -1245,80 +2033,53 @@ with tab4:
     col1, col2 = st.columns(2)
     
     with col1:
-        if st.button("Generate 10 Sample Properties"):
-            sample_properties = [
-                {"address": "123 Oak St, Seattle, WA", "price": 450000, "bedrooms": 3, "bathrooms": 2, "property_type": "house", "sqft": 1800},
-                {"address": "456 Pine Ave, Seattle, WA", "price": 325000, "bedrooms": 2, "bathrooms": 1, "property_type": "condo", "sqft": 1200},
-                {"address": "789 Elm Dr, Bellevue, WA", "price": 675000, "bedrooms": 4, "bathrooms": 3, "property_type": "house", "sqft": 2400},
-                {"address": "321 Maple Ln, Redmond, WA", "price": 275000, "bedrooms": 2, "bathrooms": 2, "property_type": "townhouse", "sqft": 1400},
-                {"address": "654 Cedar St, Kirkland, WA", "price": 825000, "bedrooms": 5, "bathrooms": 4, "property_type": "house", "sqft": 3200},
-                {"address": "987 Birch Rd, Bothell, WA", "price": 395000, "bedrooms": 3, "bathrooms": 2, "property_type": "condo", "sqft": 1600},
-                {"address": "147 Spruce Ave, Tacoma, WA", "price": 550000, "bedrooms": 3, "bathrooms": 3, "property_type": "house", "sqft": 2000},
-                {"address": "258 Willow Dr, Everett, WA", "price": 425000, "bedrooms": 3, "bathrooms": 2, "property_type": "townhouse", "sqft": 1700},
-                {"address": "369 Aspen St, Renton, WA", "price": 750000, "bedrooms": 4, "bathrooms": 3, "property_type": "house", "sqft": 2800},
-                {"address": "741 Cherry Ln, Kent, WA", "price": 300000, "bedrooms": 2, "bathrooms": 1, "property_type": "condo", "sqft": 1100}
-            ]
-            
-            tags_options = [
-                ["garage", "fireplace"], ["pool", "deck"], ["updated kitchen"], 
-                ["hardwood floors", "garage"], ["mountain view", "fireplace", "deck"],
-                ["downtown", "balcony"], ["garage", "garden"], ["fireplace", "updated"],
-                ["view", "garage", "deck"], ["parking", "balcony"]
+        with st.form("gen_samples"):
+            generate_properties = st.form_submit_button("Generate 10 Sample Properties")
+        if generate_properties:
+            sample_rows = [
+                {
+                    "user_id": 1,  # Assuming user 1 exists
+                    "data": prop,
+                    "search_params": {"location": prop["address"].split(",")[-2].strip(), "max_price": prop["price"] + 50000},
+                    "tags": SAMPLE_TAGS[i]
+                }
+                for i, prop in enumerate(SAMPLE_PROPERTIES)
             ]
             
             try:
-                for i, prop in enumerate(sample_properties):
-                    property_hash = hashlib.md5(f"{prop['address']}_{prop['price']}".encode()).hexdigest()
-                    supabase.table("properties").insert({
-                        "user_id": 1,  # Assuming user 1 exists
-                        "property_hash": property_hash,
-                        "data": prop,
-                        "search_params": {"location": prop["address"].split(",")[-2].strip(), "max_price": prop["price"] + 50000},
-                        "tags": tags_options[i]
-                    }).execute()
+                with st.status("Inserting sample properties...") as status:
+                    # One set-based INSERT ... SELECT server-side; re-runs skip rows that already exist
+                    try:
+                        inserted = bulk_insert_properties(sample_rows)
+                    except APIError as e:
+                        if e.code != "PGRST202":
+                            raise
+                        # bulk_insert_properties not installed yet - fall back to a PostgREST upsert
+                        inserted = bulk_insert("properties", sample_rows, on_conflict="user_id,property_hash")
+                    status.update(label="Sample properties inserted", state="complete")
                 
-                st.success("✅ Generated 10 sample properties with proper tags and JSONB data!")
+                refresh_analytics_views()
+                invalidate_data_caches()
+                skipped = len(sample_rows) - inserted
+                st.success(f"✅ Generated {inserted} sample properties with proper tags and JSONB data!"
+                           + (f" ({skipped} already existed)" if skipped else ""))
             except Exception as e:
                 st.error(f"Error generating sample data: {e}")
     
     with col2:
         if st.button("Generate Sample Users & Alerts"):
-            sample_users = [
-                {"email": "john.buyer@example.com", "full_name": "John Buyer", "role": "subscriber"},
-                {"email": "sarah.agent@realty.com", "full_name": "Sarah Agent", "role": "agent"},
-                {"email": "admin@portal.com", "full_name": "Admin User", "role": "admin"}
-            ]
-            
-            sample_alerts = [
-                {
-                    "alert_name": "Seattle Price Drop Alert",
-                    "alert_type": "price_drop",
-                    "location": "Seattle, WA",
-                    "criteria": {"property_type": "house", "max_price": 600000},
-                    "threshold": 25000
-                },
-                {
-                    "alert_name": "New Condo Listings",
-                    "alert_type": "new_listing", 
-                    "location": "Bellevue, WA",
-                    "criteria": {"property_type": "condo", "min_bedrooms": 2},
-                    "threshold": 0
-                }
-            ]
-            
             try:
-                # Add users
-                user_ids = []
-                for user in sample_users:
-                    result = supabase.table("users").insert(user).execute()
-                    user_ids.append(result.data[0]['id'])
+                # One multi-row insert per table; the users insert returns the new ids
+                result = supabase.table("users").insert(list(SAMPLE_USERS)).execute()
                 
                 # Add alerts for first user
-                for alert in sample_alerts:
-                    alert["user_id"] = user_ids[0]
-                    supabase.table("market_alerts").insert(alert).execute()
+                first_user_id = result.data[0]['id']
+                supabase.table("market_alerts").insert(
+                    [{**alert, "user_id": first_user_id} for alert in SAMPLE_ALERTS]
+                ).execute()
                 
-                st.success(f"✅ Generated {len(sample_users)} users and {len(sample_alerts)} alerts!")
+                invalidate_data_caches()
+                st.success(f"✅ Generated {len(SAMPLE_USERS)} users and {len(SAMPLE_ALERTS)} alerts!")
             except Exception as e:
                 st.error(f"Error generating sample data: {e}")
 
@@ -1328,53 +2089,42 @@ with tab4:
 with tab5:
     st.subheader("📈 Real Estate Portal Analytics")
     
-    # Quick metrics
-    try:
-        users_count = supabase.table("users").select("id", count="exact").execute()
-        properties_count = supabase.table("properties").select("id", count="exact").execute()
-        api_calls_count = supabase.table("api_usage").select("id", count="exact").execute()
-        alerts_count = supabase.table("market_alerts").select("id", count="exact").execute()
-        
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("Total Users", users_count.count if users_count.count else 0)
-        with col2:
-            st.metric("Total Properties", properties_count.count if properties_count.count else 0)
-        with col3:
-            st.metric("API Calls", api_calls_count.count if api_calls_count.count else 0)
-        with col4:
-            st.metric("Active Alerts", alerts_count.count if alerts_count.count else 0)
+    # Quick metrics - planner estimates unless exact counts are asked for
+    col1, col2 = st.columns(2)
+    with col1:
+        exact_counts = st.button("🔢 Recompute exact counts")
+    with col2:
+        if st.button("🔄 Refresh metrics"):
+            portal_counts.clear()
+            st.session_state.pop("metrics_disabled", None)
+    
+    # After one failed fetch, skip the count round-trips for the rest of the session until Refresh
+    if st.session_state.get("metrics_disabled"):
+        st.info("Enable metrics by ensuring tables exist and have data, then click Refresh metrics")
+    else:
+        try:
+            counts = portal_counts(exact=exact_counts)
             
-    except Exception as e:
-        st.info("Enable metrics by ensuring tables exist and have data")
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Total Users", counts["users"])
+            with col2:
+                st.metric("Total Properties", counts["properties"])
+            with col3:
+                st.metric("API Calls", counts["api_usage"])
+            with col4:
+                st.metric("Active Alerts", counts["market_alerts"])
+            
+            if not exact_counts:
+                st.caption("Counts are planner estimates and may lag recent writes until the next ANALYZE")
+                
+        except (APIError, httpx.HTTPError, KeyError, TypeError):
+            st.session_state["metrics_disabled"] = True
+            st.info("Enable metrics by ensuring tables exist and have data, then click Refresh metrics")
     
     # Index Performance Information
     with st.expander("📊 Database Index Performance", expanded=True):
-        st.markdown("""
-        **Fixed Index Types and Their Performance Benefits:**
-        
-        **🚀 GIN Indexes (Fixed):**
-        - `idx_properties_data_gin`: Full JSONB search capabilities
-        - `idx_properties_tags_gin`: Fast array operations
-        - Query types: `@>`, `?`, `?&`, `?|` operators
-        
-        **⚡ Expression Indexes:**
-        - `idx_properties_price`: Fast numeric price queries
-        - `idx_properties_bedrooms`: Bedroom filtering
-        - `idx_properties_property_type`: Property type searches
-        
-        **📈 Expected Query Performance:**
-        ```sql
-        -- Fast with GIN index
-        SELECT * FROM properties WHERE data @> '{"property_type": "house"}';
-        
-        -- Fast with Expression index  
-        SELECT * FROM properties WHERE (data->>'price')::NUMERIC > 500000;
-        
-        -- Fast with Array GIN index
-        SELECT * FROM properties WHERE 'pool' = ANY(tags);
-        ```
-        """)
+        st.markdown(INDEX_PERFORMANCE_MD)
     
     # Sample analytics queries to implement
     st.subheader("📊 Analytics Queries to Implement")
@@ -1383,31 +2133,24 @@ with tab5:
     
     with col1:
         st.markdown("**Property Analytics:**")
-        property_analytics = [
-            "Properties by price range distribution",
-            "Average property prices by type", 
-            "Properties by location (city/state)",
-            "Price trends over time",
-            "Most popular property features",
-            "Property size vs price correlation"
-        ]
-        
-        for query in property_analytics:
-            st.write(f"• {query}")
+        st.markdown(PROPERTY_ANALYTICS_MD)
     
     with col2:
         st.markdown("**User Analytics:**")
-        user_analytics = [
-            "User activity over time",
-            "Most popular search locations", 
-            "API usage patterns by user role",
-            "User engagement metrics (favorites, notes)",
-            "Search to save conversion rates",
-            "Alert effectiveness tracking"
-        ]
-        
-        for query in user_analytics:
-            st.write(f"• {query}")
+        st.markdown(USER_ANALYTICS_MD)
+    
+    # Served from portal_analytics_mv - refreshed after the app's property writes (and hourly with pg_cron)
+    st.subheader("🏷️ Properties by Type")
+    try:
+        summary = property_type_summary()
+        if summary.num_rows:
+            st.dataframe(summary, use_container_width=True)
+            st.caption("Pre-aggregated in portal_analytics_mv; refreshed after each property write, "
+                       "and hourly when pg_cron is enabled")
+        else:
+            st.info("No priced properties yet - generate sample data in the 'Data Entry' tab")
+    except Exception:
+        st.info("Create portal_analytics_mv via the schema setup to enable this summary")
     
     # Performance monitoring
     st.subheader("🔧 Performance Monitoring")
@@ -1415,43 +2158,7 @@ with tab5:
     
     # Sample query performance tips
     with st.expander("⚡ Query Performance Tips", expanded=False):
-        st.markdown("""
-        **Optimized Query Patterns:**
-        
-        **✅ DO - Use indexes effectively:**
-        ```sql
-        -- Uses GIN index
-        WHERE data @> '{"bedrooms": 3}'
-        
-        -- Uses expression index
-        WHERE (data->>'price')::NUMERIC BETWEEN 200000 AND 500000
-        
-        -- Uses array GIN index
-        WHERE tags && ARRAY['pool', 'garage']
-        ```
-        
-        **❌ AVOID - Patterns that can't use indexes:**
-        ```sql
-        -- Can't use index - function on left side
-        WHERE LOWER(data->>'address') LIKE '%seattle%'
-        
-        -- Can't use GIN index - negation
-        WHERE NOT (data @> '{"type": "condo"}')
-        
-        -- Can't use expression index - text operations on numeric field
-        WHERE (data->>'price') LIKE '5%'
-        ```
-        
-        **🚀 Advanced Optimization:**
-        ```sql
-        -- Combine indexes for complex queries
-        SELECT * FROM properties 
-        WHERE data @> '{"property_type": "house"}'  -- GIN index
-          AND (data->>'price')::NUMERIC < 500000    -- Expression index
-          AND user_id = 123                         -- B-tree index
-          AND 'garage' = ANY(tags);                 -- Array GIN index
-        ```
-        """)
+        st.markdown(QUERY_PERFORMANCE_TIPS_MD)
 
 # ------------------------
 # Cleanup & Delete
@@ -1459,34 +2166,49 @@ with tab5:
 with st.sidebar:
     st.subheader("🗑️ Data Management")
     
+    # Destructive actions only run after an explicit confirm, never on a stray rerun
     if st.button("🧹 Clear All API Usage"):
-        try:
-            supabase.table("api_usage").delete().neq("id", 0).execute()
-            st.success("API usage cleared")
-        except Exception as e:
-            st.error(f"Error: {e}")
+        st.session_state["pending_delete"] = "api_usage"
     
     if st.button("🗑️ Delete Sample Properties"):
-        try:
-            supabase.table("properties").delete().eq("user_id", 1).execute()
-            st.success("Sample properties deleted")
-        except Exception as e:
-            st.error(f"Error: {e}")
+        st.session_state["pending_delete"] = "sample_properties"
     
     if st.button("🔄 Reset All Data"):
-        if st.checkbox("I understand this will delete ALL data"):
-            try:
-                # Delete in correct order to avoid foreign key issues
-                tables_to_clear = ["api_usage", "market_alerts", "saved_searches", 
-                                 "property_comparisons", "properties", "user_preferences", 
-                                 "user_sessions", "portfolio_analytics", "users"]
-                
-                for table in tables_to_clear:
-                    supabase.table(table).delete().neq("id", 0).execute()
-                
-                st.success("✅ All data reset successfully")
-            except Exception as e:
-                st.error(f"Error during reset: {e}")
+        st.session_state["pending_delete"] = "all_data"
+    
+    pending_delete = st.session_state.get("pending_delete")
+    if pending_delete:
+        if pending_delete == "api_usage":
+            st.warning("Clear ALL API usage records?")
+        elif pending_delete == "all_data":
+            st.warning("This will delete ALL data in every portal table")
+        else:
+            st.warning("Delete all properties owned by user 1?")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("✅ Confirm", key="confirm_delete"):
+                del st.session_state["pending_delete"]
+                try:
+                    if pending_delete == "api_usage":
+                        supabase.rpc("truncate_api_usage").execute()
+                        invalidate_data_caches()
+                        st.success("API usage cleared")
+                    elif pending_delete == "all_data":
+                        # One server-side TRUNCATE ... CASCADE instead of a DELETE round-trip per table
+                        supabase.rpc("reset_all_data").execute()
+                        invalidate_data_caches()
+                        st.success("✅ All data reset successfully")
+                    else:
+                        deleted = supabase.rpc("delete_sample_properties", {"sample_user_id": 1}).execute()
+                        refresh_analytics_views()
+                        invalidate_data_caches()
+                        st.success(f"{deleted.data} sample properties deleted")
+                except Exception as e:
+                    st.error(f"Error: {e}")
+        with col2:
+            if st.button("✖️ Cancel", key="cancel_delete"):
+                del st.session_state["pending_delete"]
 
 st.sidebar.markdown("---")
 st.sidebar.caption("💡 Fixed version with proper GIN index syntax!")